@@ -0,0 +1,131 @@
+# app/admission.py - per-route concurrency limits and load shedding
+import asyncio
+import json
+import time
+from typing import Dict, Optional, Tuple
+
+from .config import (
+    ADMISSION_ENABLED,
+    ADMISSION_RULES,
+    ADMISSION_MAX_WAITERS,
+    ADMISSION_RETRY_AFTER,
+)
+from .metrics import ADMISSION_SHED, ADMISSION_WAIT
+
+
+def parse_rule(rule: str) -> Tuple[int, float]:
+    """'8/1.5' -> (8 concurrent requests, wait at most 1.5 s for a slot)"""
+    concurrency, max_wait = rule.split("/")
+    return int(concurrency), float(max_wait)
+
+
+class Gate:
+    """A bounded number of in-flight requests plus a short, bounded wait for a slot"""
+
+    def __init__(self, path: str, concurrency: int, max_wait: float, max_waiters: int):
+        self.path = path
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.max_waiters = max_waiters
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def acquire(self) -> Optional[str]:
+        """None once a slot is held, otherwise why the request was shed"""
+        if not self._slots.locked():
+            await self._slots.acquire()  # free slot: doesn't block
+        elif self.waiting >= self.max_waiters:
+            return "queue_full"
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                return "timeout"
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "concurrency": self.concurrency,
+            "max_wait": self.max_wait,
+        }
+
+
+class AdmissionController:
+    """Gates keyed by request path; paths without a rule (e.g. /health) are never shed"""
+
+    def __init__(self, rules: Dict[str, str], max_waiters: int = ADMISSION_MAX_WAITERS,
+                 enabled: bool = ADMISSION_ENABLED):
+        self.enabled = enabled
+        self.gates = {}
+        for path, rule in rules.items():
+            concurrency, max_wait = parse_rule(rule)
+            self.gates[path] = Gate(path, concurrency, max_wait, max_waiters)
+
+    def gate_for(self, path: str) -> Optional[Gate]:
+        if not self.enabled:
+            return None
+        return self.gates.get(path.rstrip("/") or "/")
+
+    def stats(self) -> dict:
+        return {path: gate.stats() for path, gate in self.gates.items()}
+
+
+class AdmissionMiddleware:
+    """
+    Plain ASGI middleware in front of the routers. A shed request gets a 503
+    before its body is read, so overload costs almost nothing to refuse.
+    """
+
+    def __init__(self, app, controller: "AdmissionController" = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        gate = self.controller.gate_for(scope["path"]) if scope["type"] == "http" else None
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        reason = await gate.acquire()
+        if reason is not None:
+            ADMISSION_SHED.labels(gate.path, reason).inc()
+            await self._shed(scope, send)
+            return
+
+        ADMISSION_WAIT.labels(gate.path).observe(time.perf_counter() - started)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+    async def _shed(self, scope, send):
+        body = json.dumps({
+            "message": "Server is busy, please retry shortly",
+            "path": scope["path"]
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(ADMISSION_RETRY_AFTER).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Global instance
+admission_controller = AdmissionController(ADMISSION_RULES)
@@ -1,16 +1,40 @@
 ﻿# app/auth.py
+import asyncio
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
 import jwt
+from fastapi import Depends, Header, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from passlib.context import CryptContext
-from .config import SECRET_KEY, JWT_ALGORITHM, JWT_EXP_MIN
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import (
+    JWT_EXP_MIN, TOKEN_CACHE_SIZE, USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS,
+    ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM,
+    ARGON2_POOL_SIZE, ARGON2_MAX_QUEUE,
+)
+from .db import get_async_db
+from .keys import get_key_ring
+from .metrics import AUTH_CACHE_LOOKUPS, HASH_DURATION, JWT_ENCODE_DURATION
+from .revocation import revocation_filter
+from . import repository
+
+logger = logging.getLogger(__name__)
 
 # Use Argon2
 pwd_context = CryptContext(
     schemes=["argon2"],
     deprecated="auto",
-    argon2__time_cost=2,
-    argon2__memory_cost=1024,
-    argon2__parallelism=2
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM
 )
 
 def hash_password(password: str) -> str:
@@ -18,9 +42,8 @@ def hash_password(password: str) -> str:
     try:
         return pwd_context.hash(password)
     except Exception as e:
-        print(f"DEBUG: Hash error: {e}")
+        logger.error("Argon2 hash failed: %s", e)
         # Fallback to SHA256 if Argon2 fails
-        import hashlib
         return hashlib.sha256(password.encode("utf-8")).hexdigest()
 
 def verify_password(password: str, hashed: str) -> bool:
@@ -28,14 +51,348 @@ def verify_password(password: str, hashed: str) -> bool:
     try:
         return pwd_context.verify(password, hashed)
     except Exception:
-        import hashlib
         return hashlib.sha256(password.encode("utf-8")).hexdigest() == hashed
 
-def create_token(user_id: int) -> str:
-    """Create JWT token for authenticated user"""
+def is_legacy_hash(hashed: str) -> bool:
+    """True for the unsalted SHA-256 fallback hashes"""
+    return len(hashed) == 64 and all(c in "0123456789abcdef" for c in hashed)
+
+def verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, if its hash is outdated (older Argon2 parameters
+    or the SHA-256 fallback), return a fresh hash to store.
+    Returns: (valid, new_hash or None)
+    """
+    if is_legacy_hash(hashed):
+        if hashlib.sha256(password.encode("utf-8")).hexdigest() != hashed:
+            return False, None
+        new_hash = hash_password(password)
+        return True, (None if is_legacy_hash(new_hash) else new_hash)
+
+    try:
+        if not pwd_context.verify(password, hashed):
+            return False, None
+    except Exception:
+        return False, None
+
+    if pwd_context.needs_update(hashed):
+        return True, hash_password(password)
+    return True, None
+
+# -------------------------------
+# Argon2 worker pool
+# -------------------------------
+
+class HashPoolBusy(RuntimeError):
+    """Raised when the Argon2 worker pool already has a full queue"""
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_stats = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "rejected": 0,
+    "in_flight": 0,
+    "max_in_flight": 0,
+    "total_seconds": 0.0,
+}
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=ARGON2_POOL_SIZE)
+    return _pool
+
+async def _run_in_pool(fn, *args, headroom: int = 0):
+    """
+    Run a hashing function in the worker pool, enforcing the queue limit.
+    `headroom` makes a background caller give way while the queue is that
+    close to full (its HashPoolBusy isn't counted as a rejection).
+    """
+    with _pool_lock:
+        if _pool_stats["in_flight"] >= max(ARGON2_POOL_SIZE, 1) + ARGON2_MAX_QUEUE - headroom:
+            if not headroom:
+                _pool_stats["rejected"] += 1
+            raise HashPoolBusy("Password hashing queue is full")
+        _pool_stats["submitted"] += 1
+        _pool_stats["in_flight"] += 1
+        _pool_stats["max_in_flight"] = max(_pool_stats["max_in_flight"], _pool_stats["in_flight"])
+
+    started = time.perf_counter()
+    ok = False
+    try:
+        if ARGON2_POOL_SIZE <= 0:
+            result = await asyncio.to_thread(fn, *args)
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(_get_pool(), fn, *args)
+        ok = True
+        return result
+    except BrokenProcessPool:
+        # A worker died; drop the pool so the next call starts a fresh one
+        shutdown_hash_pool(wait=False)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        HASH_DURATION.labels(fn.__name__).observe(elapsed)
+        with _pool_lock:
+            _pool_stats["in_flight"] -= 1
+            _pool_stats["completed" if ok else "failed"] += 1
+            _pool_stats["total_seconds"] += elapsed
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password in the Argon2 worker pool without blocking the event loop"""
+    return await _run_in_pool(hash_password, password)
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """hash_password for a slice of passwords in one worker round trip"""
+    return [hash_password(password) for password in passwords]
+
+# Bulk hashing leaves one worker to interactive requests, and waits while the
+# queue is more than half full instead of filling it up to the rejection limit
+_BULK_WORKERS = max(ARGON2_POOL_SIZE - 1, 1)
+_BULK_HEADROOM = max(ARGON2_MAX_QUEUE // 2, 1)
+
+async def hash_passwords_async(passwords: List[str], slice_size: int = 16) -> List[str]:
+    """
+    Bulk hashing (user import) through the shared worker pool. Work goes in
+    small slices on fewer than ARGON2_POOL_SIZE workers, so interactive logins
+    and signups queue behind a slice rather than the whole batch, and the
+    import backs off rather than pushing them into HashPoolBusy.
+    """
+    slots = asyncio.Semaphore(_BULK_WORKERS)
+
+    async def run(chunk):
+        async with slots:
+            while True:
+                try:
+                    return await _run_in_pool(hash_passwords, chunk, headroom=_BULK_HEADROOM)
+                except HashPoolBusy:
+                    await asyncio.sleep(0.05)
+
+    slices = [passwords[i:i + slice_size] for i in range(0, len(passwords), slice_size)]
+    results = await asyncio.gather(*(run(chunk) for chunk in slices))
+    return [hashed for chunk in results for hashed in chunk]
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    """Verify a password in the Argon2 worker pool without blocking the event loop"""
+    return await _run_in_pool(verify_password, password, hashed)
+
+async def verify_and_update_async(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """verify_and_update in the Argon2 worker pool"""
+    return await _run_in_pool(verify_and_update, password, hashed)
+
+def get_hash_pool_metrics() -> dict:
+    """Return a snapshot of the Argon2 worker pool counters"""
+    with _pool_lock:
+        stats = dict(_pool_stats)
+    finished = stats["completed"] + stats["failed"]
+    stats["avg_ms"] = round(stats.pop("total_seconds") * 1000 / finished, 2) if finished else 0.0
+    stats["workers"] = ARGON2_POOL_SIZE
+    stats["max_queue"] = ARGON2_MAX_QUEUE
+    stats["queued"] = max(stats["in_flight"] - max(ARGON2_POOL_SIZE, 1), 0)
+    return stats
+
+def shutdown_hash_pool(wait: bool = True):
+    """Stop the Argon2 worker processes"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+def create_token(user_id: int, session_id: Optional[str] = None) -> str:
+    """Create JWT token for authenticated user (session_id: refresh-token family, for revocation)"""
     payload = {
         "sub": str(user_id),
+        "type": "access",
         "exp": datetime.utcnow() + timedelta(minutes=JWT_EXP_MIN),
         "iat": datetime.utcnow(),
     }
-    return jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
\ No newline at end of file
+    if session_id:
+        payload["sid"] = session_id
+    with JWT_ENCODE_DURATION.labels("access").time():
+        return get_key_ring().sign(payload)
+
+# -------------------------------
+# Authenticated user
+# -------------------------------
+
+class TTLCache:
+    """Bounded LRU where every entry carries its own expiry (time.time() seconds)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[object, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, expires_at: float):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Decoded access-token claims keyed by token digest, kept until the token's exp
+token_cache = TTLCache(TOKEN_CACHE_SIZE)
+# Profile rows keyed by user id; routers invalidate on profile or password change
+user_cache = TTLCache(USER_CACHE_SIZE)
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail: str = "Invalid or expired token") -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+def require_api_key(keys: List[str], feature: str):
+    """
+    Dependency for service-to-service endpoints: X-API-Key must be one of
+    `keys`. While `keys` is empty the feature is off (403).
+    """
+    def check(x_api_key: Optional[str] = Header(None)):
+        if not keys:
+            raise HTTPException(status_code=403, detail=f"{feature} is disabled")
+        # Check every key so the response time doesn't reveal which one nearly matched
+        matched = False
+        for key in keys:
+            matched |= hmac.compare_digest((x_api_key or "").encode("utf-8"), key.encode("utf-8"))
+        if not matched:
+            raise HTTPException(status_code=401, detail="Invalid API key")
+    return check
+
+
+def _verify_access_token(token: str) -> dict:
+    claims = get_key_ring().decode(token, options={"require": ["exp", "sub"]})
+    # Password-reset tokens are signed by the same keys; tokens issued before
+    # the "type" claim existed are access tokens
+    if claims.get("type", "access") != "access":
+        raise jwt.InvalidTokenError("Not an access token")
+    return claims
+
+
+def decode_access_token(token: str, use_cache: bool = True) -> dict:
+    """Verified claims of an access token (cached); raises jwt.InvalidTokenError"""
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    if use_cache:
+        claims = token_cache.get(digest)
+        if claims is not None:
+            AUTH_CACHE_LOOKUPS.labels("token", "hit").inc()
+            return claims
+
+    AUTH_CACHE_LOOKUPS.labels("token", "miss").inc()
+    claims = _verify_access_token(token)
+    token_cache.set(digest, claims, claims["exp"])
+    return claims
+
+
+# Below this many distinct tokens, verifying inline is cheaper than a thread hop
+_INLINE_BATCH = 16
+
+
+def _decode_batch(tokens: List[str], use_cache: bool) -> dict:
+    """token -> claims, or the reason it is invalid"""
+    decoded = {}
+    for token in tokens:
+        try:
+            decoded[token] = decode_access_token(token, use_cache)
+        except jwt.ExpiredSignatureError:
+            decoded[token] = "expired"
+        except jwt.InvalidTokenError:
+            decoded[token] = "invalid"
+    return decoded
+
+
+async def introspect_tokens(tokens: List[str], use_cache: bool = True) -> List[dict]:
+    """
+    Validity, subject, expiry and revocation for each token, in input order.
+    Duplicates are verified once, signatures off the event loop for big
+    batches, and revocation is settled with at most one query for the batch.
+    """
+    unique = list(dict.fromkeys(tokens))
+    if len(unique) > _INLINE_BATCH:
+        decoded = await asyncio.to_thread(_decode_batch, unique, use_cache)
+    else:
+        decoded = _decode_batch(unique, use_cache)
+
+    session_ids = {claims["sid"] for claims in decoded.values() if isinstance(claims, dict) and "sid" in claims}
+    revoked = await revocation_filter.revoked_among(session_ids)
+
+    results = []
+    for token in tokens:
+        claims = decoded[token]
+        if not isinstance(claims, dict):
+            results.append({"active": False, "error": claims})
+            continue
+        is_revoked = claims.get("sid") in revoked
+        results.append({
+            "active": not is_revoked,
+            "sub": claims["sub"],
+            "exp": claims["exp"],
+            "iat": claims.get("iat"),
+            "sid": claims.get("sid"),
+            "revoked": is_revoked,
+        })
+    return results
+
+
+async def get_current_user_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)
+) -> int:
+    """Bearer-token dependency: the authenticated user's id (no database access)"""
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    try:
+        claims = decode_access_token(credentials.credentials)
+        user_id = int(claims["sub"])
+    except (jwt.InvalidTokenError, ValueError):
+        raise _unauthorized()
+    # Logged out or password reset since the token was issued (filter hit -> one query)
+    if "sid" in claims and await revocation_filter.is_revoked(claims["sid"]):
+        raise _unauthorized("Session has been revoked")
+    return user_id
+
+
+async def get_current_user(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+) -> dict:
+    """
+    The authenticated user's profile row, cached for USER_CACHE_TTL_SECONDS.
+    Read from the primary: a replica could put a pre-update row back in the cache.
+    """
+    user = user_cache.get(user_id)
+    if user is None:
+        AUTH_CACHE_LOOKUPS.labels("user", "miss").inc()
+        row = await repository.get_profile(db, user_id)
+        if row is None:
+            raise _unauthorized("User no longer exists")
+        user = dict(row._mapping)
+        user_cache.set(user_id, user, time.time() + USER_CACHE_TTL_SECONDS)
+    else:
+        AUTH_CACHE_LOOKUPS.labels("user", "hit").inc()
+    if not user["is_active"]:
+        raise HTTPException(status_code=403, detail="Account is disabled")
+    return user
\ No newline at end of file
@@ -0,0 +1,245 @@
+# app/bulk_import.py - create many accounts at once from CSV or JSONL
+"""
+Input is streamed and handled IMPORT_CHUNK_SIZE rows at a time:
+
+  1. each row is validated and normalised with the SignupRequest rules
+     (confirm_password defaults to password) and deduplicated within the chunk
+  2. one set-based query finds the emails/usernames that already exist
+  3. passwords are hashed in slices across the Argon2 worker pool
+  4. the chunk is loaded with COPY into a temporary table and moved into
+     users with INSERT ... SELECT ... ON CONFLICT DO NOTHING, so a row that
+     raced in since step 2 is reported instead of failing the chunk
+     (SQLite: one multi-row INSERT ... ON CONFLICT DO NOTHING)
+
+Each chunk commits on its own. Bad rows are reported with their line number
+and never abort the import; a chunk that hits a database or hashing error
+has its rows reported as failed and the import moves on.
+"""
+import codecs
+import csv
+import json
+import logging
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+from sqlalchemy import func, or_, select, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from .auth import HashPoolBusy, hash_passwords_async
+from .config import IMPORT_CHUNK_SIZE
+from .db import AsyncReadSessionLocal, AsyncSessionLocal
+from .models import User
+from .schemas import SignupRequest
+from .utils.emails import normalize_email
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "jsonl")
+
+# users columns filled by an import; the rest keep their defaults
+_COLUMNS = ("first_name", "last_name", "email", "username", "password_hash", "is_active", "created_at")
+
+
+async def decode_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Lines of a UTF-8 byte stream (e.g. a request body), without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def iter_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Tuple[int, Union[dict, str]]]:
+    """
+    (line number, fields) per record; fields is an error message for a line
+    that can't be parsed. CSV needs a header row and one record per line.
+    """
+    header = None
+    number = 0
+    async for line in lines:
+        number += 1
+        line = line.rstrip("\r")
+        if not line.strip():
+            continue
+        if fmt == "jsonl":
+            try:
+                fields = json.loads(line)
+            except ValueError as e:
+                yield number, f"Invalid JSON: {e}"
+                continue
+            yield number, fields if isinstance(fields, dict) else "Expected a JSON object"
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            continue
+        if len(values) != len(header):
+            yield number, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield number, dict(zip(header, values))
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+def _validate(fields: dict) -> SignupRequest:
+    fields = dict(fields)
+    if not fields.get("confirm_password"):
+        fields["confirm_password"] = fields.get("password")
+    return SignupRequest(**fields)
+
+
+def _too_long(fields: dict) -> Optional[str]:
+    """EmailStr allows longer addresses than users.email holds; PostgreSQL would reject the whole chunk"""
+    for column, value in fields.items():
+        length = User.__table__.c[column].type.length
+        if len(value) > length:
+            return f"{column}: at most {length} characters"
+    return None
+
+
+async def _load_postgres(db, records: List[dict]) -> set:
+    columns = ", ".join(_COLUMNS)
+    # Created inside the chunk's transaction and dropped at its commit
+    await db.execute(text("CREATE TEMP TABLE user_import (LIKE users INCLUDING DEFAULTS) ON COMMIT DROP"))
+    connection = await (await db.connection()).get_raw_connection()
+    await connection.driver_connection.copy_records_to_table(
+        "user_import",
+        records=[tuple(record[column] for column in _COLUMNS) for record in records],
+        columns=_COLUMNS,
+    )
+    result = await db.execute(text(
+        f"INSERT INTO users ({columns}) SELECT {columns} FROM user_import "
+        f"ON CONFLICT DO NOTHING RETURNING email"
+    ))
+    return set(result.scalars().all())
+
+
+async def _load_sqlite(db, records: List[dict]) -> set:
+    from sqlalchemy.dialects.sqlite import insert
+
+    result = await db.execute(insert(User).values(records).on_conflict_do_nothing().returning(User.email))
+    return set(result.scalars().all())
+
+
+async def _import_chunk(chunk: List[Tuple[int, Union[dict, str]]], report: dict):
+    def fail(number: int, email, error: str):
+        report["errors"].append({"row": number, "email": email, "error": error})
+
+    candidates: Dict[str, Tuple[int, SignupRequest, str]] = {}  # email -> (row, request, username)
+    usernames: Dict[str, str] = {}  # username -> email
+    for number, fields in chunk:
+        if isinstance(fields, str):
+            fail(number, None, fields)
+            continue
+        try:
+            request = _validate(fields)
+        except ValidationError as e:
+            fail(number, fields.get("email"), _describe(e))
+            continue
+        # Same rule as POST /api/signup
+        username = f"{request.first_name}{request.last_name}".strip().lower()
+        too_long = _too_long({"first_name": request.first_name.strip(), "last_name": request.last_name.strip(),
+                              "email": request.email, "username": username})
+        if too_long:
+            fail(number, request.email, too_long)
+        elif request.email in candidates:
+            fail(number, request.email, "Duplicate email in this import")
+        elif username in usernames:
+            fail(number, request.email, "Duplicate username in this import")
+        else:
+            candidates[request.email] = (number, request, username)
+            usernames[username] = request.email
+    if not candidates:
+        return
+
+    try:
+        inserted, entries = await _store_chunk(candidates, usernames, fail)
+    except (SQLAlchemyError, HashPoolBusy, BrokenProcessPool, OSError) as e:
+        logger.error("Bulk import: chunk of %d row(s) not imported: %s", len(candidates), e)
+        for number, request, _ in candidates.values():
+            fail(number, request.email, f"Not imported ({type(e).__name__}); retry this row")
+        return
+
+    for number, request, _ in entries:
+        if request.email not in inserted:
+            fail(number, request.email, "Email or username already exists")
+    report["created"] += len(inserted)
+
+
+async def _store_chunk(candidates: Dict[str, Tuple[int, SignupRequest, str]], usernames: Dict[str, str], fail):
+    """Steps 2-4 for the validated rows; returns (emails inserted, entries attempted)"""
+    # One lookup for the whole chunk (a replica is fine: the INSERT catches anything it missed)
+    async with AsyncReadSessionLocal() as db:
+        existing = await db.execute(
+            select(User.email, User.username)
+            # lower(email): the expression of the unique email index (see repository.by_email)
+            .where(or_(func.lower(User.email).in_(list(candidates)), User.username.in_(list(usernames))))
+        )
+        existing = existing.all()
+    for row in existing:
+        email = normalize_email(row.email)
+        if email in candidates:
+            number, request, username = candidates.pop(email)
+            usernames.pop(username, None)
+            fail(number, email, "Email already exists")
+        email = usernames.pop(row.username, None)
+        if email in candidates:
+            fail(candidates.pop(email)[0], email, "Username already exists")
+    if not candidates:
+        return set(), []
+
+    # Hashing happens with no database connection held
+    entries = list(candidates.values())
+    hashes = await hash_passwords_async([request.password for _, request, _ in entries])
+    now = datetime.now(timezone.utc)
+    records = [
+        {
+            "first_name": request.first_name.strip(),
+            "last_name": request.last_name.strip(),
+            "email": request.email,
+            "username": username,
+            "password_hash": password_hash,
+            "is_active": True,
+            "created_at": now,
+        }
+        for (_, request, username), password_hash in zip(entries, hashes)
+    ]
+
+    async with AsyncSessionLocal() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            inserted = await _load_postgres(db, records)
+        else:
+            inserted = await _load_sqlite(db, records)
+        await db.commit()
+    return inserted, entries
+
+
+async def import_users(lines: AsyncIterator[str], fmt: str = "csv", chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """Create the accounts described by `lines`; returns totals and per-row errors"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format {fmt!r}")
+    report = {"total": 0, "created": 0, "failed": 0, "errors": []}
+    chunk = []
+    async for record in iter_records(lines, fmt):
+        report["total"] += 1
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            await _import_chunk(chunk, report)
+            chunk = []
+            logger.info("Bulk import: %d rows read, %d created so far", report["total"], report["created"])
+    if chunk:
+        await _import_chunk(chunk, report)
+    report["errors"].sort(key=lambda error: error["row"])
+    report["failed"] = len(report["errors"])
+    logger.info("Bulk import finished: %d created, %d failed", report["created"], report["failed"])
+    return report
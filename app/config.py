@@ -9,6 +9,33 @@ SECRET_KEY = os.getenv("SECRET_KEY", "")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_EXP_MIN = int(os.getenv("JWT_EXP_MIN", "60"))
 
+# Asymmetric signing (JWT_ALGORITHM=EdDSA or ES256): private keys as <kid>.pem files in
+# JWT_KEY_DIR (e.g. Render secret files) and/or one PEM in JWT_PRIVATE_KEY.
+# JWT_KEY_ID picks the signing key; the others stay published for verification.
+# It is required once there is more than one key (the app won't start without it).
+JWT_KEY_DIR = os.getenv("JWT_KEY_DIR", "")
+JWT_PRIVATE_KEY = os.getenv("JWT_PRIVATE_KEY", "").replace("\\n", "\n")
+JWT_KEY_ID = os.getenv("JWT_KEY_ID", "")
+JWKS_MAX_AGE = int(os.getenv("JWKS_MAX_AGE", "3600"))  # Cache-Control for /.well-known/jwks.json
+
+# Refresh tokens and access-token revocation
+REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", "30"))
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "30"))
+REVOCATION_FILTER_FP_RATE = float(os.getenv("REVOCATION_FILTER_FP_RATE", "0.001"))
+
+# POST /api/token/introspect for internal services (X-API-Key; disabled while empty)
+INTROSPECTION_API_KEYS = [key.strip() for key in os.getenv("INTROSPECTION_API_KEYS", "").split(",") if key.strip()]
+INTROSPECTION_MAX_TOKENS = int(os.getenv("INTROSPECTION_MAX_TOKENS", "100"))
+
+# Admin endpoints, e.g. POST /api/admin/users/import (X-API-Key; disabled while empty)
+ADMIN_API_KEYS = [key.strip() for key in os.getenv("ADMIN_API_KEYS", "").split(",") if key.strip()]
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))  # rows validated, hashed and loaded together
+
+# Per-process caches behind get_current_user (decoded tokens live until their exp)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
 SMTP_SERVER = os.getenv("SMTP_SERVER", "")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
@@ -16,4 +43,85 @@ SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@example.com")
 
 APP_NAME = os.getenv("APP_NAME", "FYP Auth API")
-ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
\ No newline at end of file
+ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+
+# Argon2 parameters (run scripts/calibrate_argon2.py to pick them per host)
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "1024"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "2"))
+
+# Argon2 worker pool (0 = hash in the default threadpool instead of processes)
+ARGON2_POOL_SIZE = int(os.getenv("ARGON2_POOL_SIZE", str(os.cpu_count() or 1)))
+ARGON2_MAX_QUEUE = int(os.getenv("ARGON2_MAX_QUEUE", "64"))
+
+# Email outbox dispatcher
+EMAIL_TRANSPORT = os.getenv("EMAIL_TRANSPORT", "resend")  # resend (SDK) | http (pooled client) | fake
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))  # Resend allows up to 100
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "5"))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+
+# Pooled async HTTP client for Resend (EMAIL_TRANSPORT=http)
+RESEND_API_URL = os.getenv("RESEND_API_URL", "https://api.resend.com")
+RESEND_HTTP2 = os.getenv("RESEND_HTTP2", "true").lower() == "true"
+RESEND_MAX_CONNECTIONS = int(os.getenv("RESEND_MAX_CONNECTIONS", "10"))
+RESEND_KEEPALIVE_SECONDS = float(os.getenv("RESEND_KEEPALIVE_SECONDS", "60"))
+RESEND_CONNECT_TIMEOUT = float(os.getenv("RESEND_CONNECT_TIMEOUT", "5"))
+RESEND_TIMEOUT = float(os.getenv("RESEND_TIMEOUT", "10"))
+RESEND_BREAKER_FAILURES = int(os.getenv("RESEND_BREAKER_FAILURES", "5"))
+RESEND_BREAKER_RESET_SECONDS = float(os.getenv("RESEND_BREAKER_RESET_SECONDS", "30"))
+
+# Rate limiting ("count/seconds" per key)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | redis
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_RULES = {
+    "login:ip": os.getenv("RATE_LIMIT_LOGIN_IP", "30/60"),
+    "login:email": os.getenv("RATE_LIMIT_LOGIN_EMAIL", "10/300"),
+    "verify:ip": os.getenv("RATE_LIMIT_VERIFY_IP", "30/60"),
+    "verify:email": os.getenv("RATE_LIMIT_VERIFY_EMAIL", "5/300"),
+}
+# X-Forwarded-For is only honoured behind a proxy that appends the peer address;
+# TRUSTED_PROXY_HOPS is how many proxies (counted from the app) append to it
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+TRUSTED_PROXY_HOPS = max(1, int(os.getenv("TRUSTED_PROXY_HOPS", "1")))
+
+# Admission control for the CPU-heavy routes ("concurrency/max queue wait seconds" per route).
+# Requests beyond the limit wait up to the max for a slot, then get a 503.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+_HASH_SLOTS = max(2, ARGON2_POOL_SIZE * 2)  # keep every hash worker busy plus one job queued each
+ADMISSION_RULES = {
+    "/api/signup": os.getenv("ADMISSION_SIGNUP", f"{_HASH_SLOTS}/2"),
+    "/api/login": os.getenv("ADMISSION_LOGIN", f"{_HASH_SLOTS}/1"),
+    "/api/password/verify-token": os.getenv("ADMISSION_VERIFY", f"{_HASH_SLOTS * 4}/1"),
+    "/api/password/reset": os.getenv("ADMISSION_RESET", f"{_HASH_SLOTS}/2"),
+}
+ADMISSION_MAX_WAITERS = int(os.getenv("ADMISSION_MAX_WAITERS", "64"))  # per route; beyond it shed at once
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# Password reset codes
+RESET_CODE_STORE = os.getenv("RESET_CODE_STORE", "database")  # database | memory
+RESET_CODE_HMAC_KEY = os.getenv("RESET_CODE_HMAC_KEY", "")  # derived from SECRET_KEY if empty
+RESET_CODE_TTL_MINUTES = int(os.getenv("RESET_CODE_TTL_MINUTES", "15"))
+RESET_CODE_MAX_ATTEMPTS = int(os.getenv("RESET_CODE_MAX_ATTEMPTS", "5"))
+# A repeat /forgot within this window reuses the pending code (no new code, write or email)
+RESET_CODE_COOLDOWN_SECONDS = float(os.getenv("RESET_CODE_COOLDOWN_SECONDS", "60"))
+RESET_CODE_SWEEP_SECONDS = float(os.getenv("RESET_CODE_SWEEP_SECONDS", "300"))
+RESET_CODE_SWEEP_BATCH = int(os.getenv("RESET_CODE_SWEEP_BATCH", "1000"))
+# Idempotency-Key replay cache for POST /api/signup and /api/password/reset
+IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", "memory")  # memory | database
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))  # per process
+# Logging (see app/logging_setup.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")  # per logger, e.g. "app.email_service=WARNING,sqlalchemy.engine=INFO"
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))  # share of routine success lines kept
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Startup: "fast" defers the DB engine, email client and OpenAPI schema to first use;
+# "eager" builds them in the lifespan hook so the first request doesn't pay for them
+STARTUP_MODE = os.getenv("STARTUP_MODE", "fast")  # fast | eager
+DOCS_ENABLED = os.getenv("DOCS_ENABLED", "true").lower() == "true"
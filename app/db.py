@@ -1,42 +1,429 @@
 ﻿# app/db.py
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
+import asyncio
+import itertools
+import logging
+import time
+from uuid import uuid4
 
-# Load environment variables
-load_dotenv()
+from sqlalchemy import exc, text
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.sql import Select
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 
-# Get DATABASE_URL from environment
-DATABASE_URL = os.getenv("DATABASE_URL")
+from .metrics import DB_POOL_CHECKOUT_WAIT, DB_POOL_EXHAUSTED, DB_REPLICA_READS
 
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL is not set in .env file")
+logger = logging.getLogger(__name__)
 
-# Fix URL for SQLAlchemy - Render uses postgres:// but SQLAlchemy needs postgresql://
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+# Engines are built on first use (first request, migration or lifespan warm-up),
+# not at import time, so a cold start only pays for what it touches.
+# `engine`, `async_engine` and DATABASE_URL are still importable names (see __getattr__).
 
-print(f"Connecting to database: {DATABASE_URL.split('@')[-1]}")
+_engine = None
+_async_engine = None
+_replica_set = None
+_settings = None
+
+
+def _normalize_url(database_url: str) -> str:
+    # Fix URL for SQLAlchemy - Render uses postgres:// but SQLAlchemy needs postgresql://
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    return database_url
+
+
+def _async_url(database_url: str):
+    from sqlalchemy.engine import make_url
+
+    url = make_url(database_url)
+    is_postgres = url.get_backend_name() == "postgresql"
+    return url.set(drivername="postgresql+asyncpg" if is_postgres else "sqlite+aiosqlite")
+
+
+def _database_settings() -> dict:
+    global _settings
+    if _settings is None:
+        from dotenv import load_dotenv
+        from sqlalchemy.engine import make_url
+
+        # Load environment variables
+        load_dotenv()
+
+        # Get DATABASE_URL from environment
+        database_url = os.getenv("DATABASE_URL")
+
+        if not database_url:
+            raise RuntimeError("DATABASE_URL is not set in .env file")
+
+        database_url = _normalize_url(database_url)
+
+        # Render requires SSL; set DATABASE_SSL=disable for a local database.
+        # SQLite URLs are accepted for benchmarks and local runs.
+        is_postgres = make_url(database_url).get_backend_name() == "postgresql"
+        _settings = {
+            "DATABASE_URL": database_url,
+            "DATABASE_SSL": os.getenv("DATABASE_SSL", "require"),
+            "DB_POOL_PROFILE": os.getenv("DB_POOL_PROFILE", "direct"),
+            "IS_POSTGRES": is_postgres,
+            "ASYNC_DATABASE_URL": _async_url(database_url),
+            # Optional read replicas (comma separated), same credentials style as DATABASE_URL
+            "DATABASE_REPLICA_URLS": [
+                _normalize_url(url.strip())
+                for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+            ],
+            "REPLICA_HEALTH_SECONDS": float(os.getenv("REPLICA_HEALTH_SECONDS", "10")),
+            "REPLICA_MAX_LAG_SECONDS": float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5")),
+        }
+    return _settings
+
+
+# -------------------------------
+# Connection pool profiles
+# -------------------------------
+
+# DB_POOL_PROFILE picks one; DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+# DB_POOL_RECYCLE and DB_POOL_PRE_PING override individual values.
+POOL_PROFILES = {
+    # Straight to Postgres: small pool, connections checked before use
+    "direct": {
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    },
+    # PgBouncer in transaction mode owns the pooling; a server connection can
+    # change between transactions, so no client pool and no prepared statements
+    "pgbouncer-transaction": {
+        "poolclass": NullPool,
+        "pool_pre_ping": False,
+    },
+    # Many concurrent requests per worker: bigger pool, fail fast when it runs
+    # dry, LIFO so idle connections age out, no per-checkout ping round trip
+    "high-concurrency": {
+        "pool_size": 20,
+        "max_overflow": 20,
+        "pool_timeout": 5,
+        "pool_recycle": 1800,
+        "pool_pre_ping": False,
+        "pool_use_lifo": True,
+    },
+}
+
+
+class PoolExhausted(exc.TimeoutError):
+    """No connection became free within pool_timeout (main.py turns this into a 503)"""
+
+
+class _TimedPoolMixin:
+    """Records how long checkouts wait for a connection and when the pool runs dry"""
+
+    def _do_get(self):
+        label = "async" if self._dialect.is_async else "sync"
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolExhausted:
+            raise  # already counted by the inner (retried) checkout
+        except exc.TimeoutError as e:
+            DB_POOL_EXHAUSTED.labels(label).inc()
+            logger.warning("⚠️ Database pool exhausted (%s): %s", label, e)
+            raise PoolExhausted(str(e)) from e
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(label).observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _env_override(options: dict, key: str, env: str, cast):
+    value = os.getenv(env)
+    if value:
+        options[key] = value.lower() == "true" if cast is bool else cast(value)
+
+
+def pool_options(is_async: bool) -> dict:
+    """create_engine keyword arguments for the configured pool profile"""
+    settings = _database_settings()
+    if not settings["IS_POSTGRES"]:
+        # SQLite (benchmarks, local runs) keeps SQLAlchemy's defaults
+        return {"pool_pre_ping": True, "pool_recycle": 300}
+
+    profile = settings["DB_POOL_PROFILE"]
+    if profile not in POOL_PROFILES:
+        raise RuntimeError(f"Unknown DB_POOL_PROFILE {profile!r}; use one of {', '.join(POOL_PROFILES)}")
+    options = dict(POOL_PROFILES[profile])
+    _env_override(options, "pool_pre_ping", "DB_POOL_PRE_PING", bool)
+    _env_override(options, "pool_recycle", "DB_POOL_RECYCLE", int)
+    if options.get("poolclass") is NullPool:
+        return options
+
+    _env_override(options, "pool_size", "DB_POOL_SIZE", int)
+    _env_override(options, "max_overflow", "DB_MAX_OVERFLOW", int)
+    _env_override(options, "pool_timeout", "DB_POOL_TIMEOUT", float)
+
+    # Keep pool_size + max_overflow across all workers within the server's budget
+    max_connections = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+    if max_connections:
+        per_worker = max(1, max_connections // int(os.getenv("WEB_CONCURRENCY", "1")))
+        options["pool_size"] = min(options["pool_size"], per_worker)
+        options["max_overflow"] = min(options["max_overflow"], per_worker - options["pool_size"])
+
+    options["poolclass"] = TimedAsyncQueuePool if is_async else TimedQueuePool
+    return options
+
+
+def get_engine():
+    """Sync psycopg2 engine (migrations, scripts)"""
+    global _engine
+    if _engine is None:
+        from sqlalchemy import create_engine
+
+        settings = _database_settings()
+        logger.info("Connecting to database: %s", settings["DATABASE_URL"].split("@")[-1])
+
+        # Create SQLAlchemy engine with SSL for Render
+        _engine = create_engine(
+            settings["DATABASE_URL"],
+            connect_args={
+                'sslmode': settings["DATABASE_SSL"]
+            } if settings["IS_POSTGRES"] else {},
+            **pool_options(is_async=False)
+        )
+    return _engine
+
+
+def _create_async_engine(url):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    settings = _database_settings()
+    connect_args = {}
+    if settings["IS_POSTGRES"]:
+        connect_args['ssl'] = settings["DATABASE_SSL"]  # asyncpg spelling of sslmode
+        if settings["DB_POOL_PROFILE"] == "pgbouncer-transaction":
+            # No server-side prepared statement reuse behind a transaction pooler
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+            )
+    return create_async_engine(url, connect_args=connect_args, **pool_options(is_async=True))
+
+
+def get_async_engine():
+    """Async engine for the request path (asyncpg), same pool profile as the sync one"""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = _create_async_engine(_database_settings()["ASYNC_DATABASE_URL"])
+    return _async_engine
+
+
+# -------------------------------
+# Read replicas
+# -------------------------------
+
+class ReplicaSet:
+    """
+    Async engines for DATABASE_REPLICA_URLS. Reads are spread round-robin over
+    the replicas that passed the last health check; with none healthy the
+    caller falls back to the primary.
+    """
+
+    def __init__(self, urls, interval: float, max_lag: float):
+        self.engines = [_create_async_engine(_async_url(url)) for url in urls]
+        self.interval = interval
+        self.max_lag = max_lag
+        self.healthy = list(range(len(self.engines)))  # optimistic until the first check
+        self._next = itertools.count()
+        self._task = None
+
+    def choose(self):
+        """(index, engine) of the next healthy replica, or None"""
+        healthy = self.healthy
+        if not healthy:
+            return None
+        index = healthy[next(self._next) % len(healthy)]
+        return index, self.engines[index]
+
+    async def _probe(self, engine) -> bool:
+        async with engine.connect() as conn:
+            if engine.dialect.name != "postgresql":
+                await conn.execute(text("SELECT 1"))
+                return True
+            # NULL on a primary (or a plain second database used for local testing)
+            lag = (await conn.execute(text(
+                "SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+            ))).scalar()
+            return lag is None or lag <= self.max_lag
+
+    async def check(self):
+        healthy = []
+        for index, engine in enumerate(self.engines):
+            reason = "replication lag"
+            try:
+                ok = await asyncio.wait_for(self._probe(engine), timeout=self.interval)
+            except Exception as e:
+                ok, reason = False, e
+            if ok:
+                healthy.append(index)
+            # Only log changes, not every failed probe of a replica that's already out
+            if ok and index not in self.healthy:
+                logger.info("✅ Replica %s back in rotation", index)
+            elif not ok and index in self.healthy:
+                logger.warning("⚠️ Replica %s out of rotation: %s", index, reason)
+        self.healthy = healthy
+
+    async def run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def get_replica_set():
+    """The configured ReplicaSet, or None without DATABASE_REPLICA_URLS"""
+    global _replica_set
+    settings = _database_settings()
+    if _replica_set is None and settings["DATABASE_REPLICA_URLS"]:
+        _replica_set = ReplicaSet(
+            settings["DATABASE_REPLICA_URLS"],
+            settings["REPLICA_HEALTH_SECONDS"],
+            settings["REPLICA_MAX_LAG_SECONDS"],
+        )
+    return _replica_set
+
+
+class RoutingSession(Session):
+    """
+    Sends plain SELECTs to a replica when the session was opened for reads
+    (info["use_replicas"]). Everything else stays on the primary: flushes,
+    INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE and text() statements, and any
+    read issued after the session has written (read-your-writes).
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        primary = get_async_engine().sync_engine
+        if not self.info.get("use_replicas"):
+            return primary
+        if self._flushing or not isinstance(clause, Select) or clause._for_update_arg is not None:
+            if self._flushing or clause is not None:
+                self.info["use_replicas"] = False  # pin to the primary from now on
+            return primary
+        replicas = get_replica_set()
+        choice = replicas.choose() if replicas else None
+        if choice is None:
+            return primary
+        index, engine = choice
+        DB_REPLICA_READS.labels(str(index)).inc()
+        return engine.sync_engine
+
+
+def built_engines() -> dict:
+    """Engines created so far, by name (for pool metrics)"""
+    engines = {}
+    if _engine is not None:
+        engines["sync"] = _engine
+    if _async_engine is not None:
+        engines["async"] = _async_engine.sync_engine
+    if _replica_set is not None:
+        for index, engine in enumerate(_replica_set.engines):
+            engines[f"replica{index}"] = engine.sync_engine
+    return engines
+
+
+async def dispose_engines():
+    if _replica_set is not None:
+        for engine in _replica_set.engines:
+            await engine.dispose()
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
+
+
+class _LazySessionmaker:
+    """Behaves like a sessionmaker, but only builds it (and the engine) on first call"""
+
+    def __init__(self, build):
+        self._build = build
+        self._maker = None
+
+    def __call__(self, **kwargs):
+        if self._maker is None:
+            self._maker = self._build()
+        return self._maker(**kwargs)
+
+
+def _build_sessionmaker():
+    from sqlalchemy.orm import sessionmaker
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+def _build_async_sessionmaker():
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    return async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+
+
+def _build_async_read_sessionmaker():
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    if get_replica_set() is None:
+        return _build_async_sessionmaker()
+    return async_sessionmaker(
+        get_async_engine(), sync_session_class=RoutingSession,
+        autoflush=False, expire_on_commit=False, info={"use_replicas": True}
+    )
 
-# Create SQLAlchemy engine with SSL for Render
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # Verify connections before using
-    pool_recycle=300,    # Recycle connections after 5 minutes
-    connect_args={
-        'sslmode': 'require'  # Render requires SSL
-    }
-)
 
 # Session and Base
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = _LazySessionmaker(_build_sessionmaker)
+AsyncSessionLocal = _LazySessionmaker(_build_async_sessionmaker)
+# Lookups that tolerate replica lag (login, forgot password); writes still go to the primary
+AsyncReadSessionLocal = _LazySessionmaker(_build_async_read_sessionmaker)
 Base = declarative_base()
 
+
+def __getattr__(name):
+    # Backwards-compatible module attributes, resolved lazily
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    if name in ("DATABASE_URL", "DATABASE_SSL", "DB_POOL_PROFILE", "IS_POSTGRES", "ASYNC_DATABASE_URL"):
+        return _database_settings()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Async dependency used by the routers
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Same, but plain SELECTs may be served by a read replica
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
@@ -0,0 +1,280 @@
+# app/email_outbox.py - durable email outbox + batched dispatcher
+import asyncio
+import base64
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from cryptography.fernet import Fernet, InvalidToken
+from sqlalchemy import select, or_, and_
+
+from .config import (
+    SECRET_KEY,
+    EMAIL_TRANSPORT,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_POLL_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_BASE_SECONDS,
+    OUTBOX_LEASE_SECONDS,
+)
+from .db import AsyncSessionLocal
+from .email_service import email_service
+from .logging_setup import SAMPLED
+from .metrics import observe_email
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Bodies carry live reset codes, so they are stored encrypted (reset_codes keeps
+# only an HMAC of the code; the outbox mustn't be the plaintext copy)
+_BODY_PREFIX = "fernet:"
+_FERNET = Fernet(base64.urlsafe_b64encode(hashlib.sha256((SECRET_KEY + ":email-outbox").encode("utf-8")).digest()))
+
+
+def _seal(text: str) -> str:
+    return _BODY_PREFIX + _FERNET.encrypt(text.encode("utf-8")).decode("ascii")
+
+
+def _open(body: str) -> str:
+    if not body:
+        return ""
+    if not body.startswith(_BODY_PREFIX):
+        return body  # queued before bodies were encrypted
+    try:
+        return _FERNET.decrypt(body[len(_BODY_PREFIX):].encode("ascii")).decode("utf-8")
+    except InvalidToken:
+        # SECRET_KEY changed since it was queued; send nothing rather than garbage
+        raise ValueError("Outbox body can't be decrypted (SECRET_KEY changed?)")
+
+
+def enqueue_email(db, to_email: str, subject: str, text: str) -> EmailOutbox:
+    """
+    Add an email to the outbox in the caller's transaction.
+    It is only sent once the caller commits.
+    """
+    row = EmailOutbox(
+        to_email=to_email,
+        subject=subject,
+        text_body=_seal(text),
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(row)
+    return row
+
+
+def enqueue_password_reset_email(db, to_email: str, reset_token: str, user_name: str) -> EmailOutbox:
+    """Queue a password reset email using the same content as email_service"""
+    message = email_service.build_password_reset_email(to_email, reset_token, user_name)
+    return enqueue_email(db, to_email, message["subject"], message["text"])
+
+
+# -------------------------------
+# Transports
+# -------------------------------
+
+def _batch_params(messages: List[dict]) -> List[dict]:
+    return [
+        {"from": email_service.from_email, "to": [m["to"]], "subject": m["subject"], "text": m["text"]}
+        for m in messages
+    ]
+
+
+def _batch_idempotency_key(messages: List[dict]) -> str:
+    # Same set of rows -> same key, so a retried batch is not delivered twice
+    ids = ",".join(str(m["id"]) for m in messages)
+    return "outbox-" + hashlib.sha256(ids.encode()).hexdigest()[:32]
+
+
+class ResendBatchTransport:
+    """Sends a whole batch with one call to Resend's /emails/batch endpoint (SDK)"""
+
+    name = "resend_batch"
+
+    async def send_batch(self, messages: List[dict]) -> List[str]:
+        if not email_service.api_key:
+            raise RuntimeError("RESEND_API_KEY not configured")
+
+        options = {"idempotency_key": _batch_idempotency_key(messages)}
+        response = await asyncio.to_thread(email_service.resend.Batch.send, _batch_params(messages), options)
+        return [item.get("id", "") for item in response.get("data", [])]
+
+
+class ResendHttpTransport:
+    """Same batch call over the shared keep-alive client in email_service"""
+
+    name = "http_batch"
+
+    async def send_batch(self, messages: List[dict]) -> List[str]:
+        if not email_service.api_key:
+            raise RuntimeError("RESEND_API_KEY not configured")
+
+        response = await email_service.http.send_batch(
+            _batch_params(messages), idempotency_key=_batch_idempotency_key(messages)
+        )
+        return [item.get("id", "") for item in response.get("data", [])]
+
+
+class FakeEmailTransport:
+    """In-memory transport for tests and local runs; records instead of sending"""
+
+    name = "fake"
+
+    def __init__(self):
+        self.sent: List[dict] = []
+        self.fail_next = 0  # number of upcoming batches to fail
+
+    async def send_batch(self, messages: List[dict]) -> List[str]:
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            raise RuntimeError("Fake transport failure")
+        self.sent.extend(messages)
+        return [f"fake-{m['id']}" for m in messages]
+
+
+def get_transport(name: str = EMAIL_TRANSPORT):
+    if name == "fake":
+        return FakeEmailTransport()
+    if name == "http":
+        return ResendHttpTransport()
+    return ResendBatchTransport()
+
+
+# -------------------------------
+# Dispatcher
+# -------------------------------
+
+class OutboxDispatcher:
+    """
+    Claims due outbox rows with FOR UPDATE SKIP LOCKED, sends them in
+    batches and records the outcome. Safe to run in every worker process.
+    """
+
+    def __init__(self, transport=None, session_factory=AsyncSessionLocal):
+        self.transport = transport or get_transport()
+        self.session_factory = session_factory
+        self._wake = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+    def backoff(self, attempts: int) -> timedelta:
+        return timedelta(seconds=OUTBOX_RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+
+    async def claim_batch(self) -> List[dict]:
+        """Lease a batch of due rows so other workers skip them"""
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(EmailOutbox)
+                .where(
+                    or_(
+                        and_(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now),
+                        # Lease expired: the worker that claimed it died mid-send
+                        and_(EmailOutbox.status == "sending", EmailOutbox.next_attempt_at <= now),
+                    )
+                )
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.scalars().all()
+            messages = []
+            for row in rows:
+                try:
+                    text = _open(row.text_body)
+                except ValueError as e:
+                    row.status = "failed"
+                    row.text_body = None
+                    row.last_error = str(e)
+                    continue
+                row.status = "sending"
+                row.attempts += 1
+                row.next_attempt_at = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+                messages.append({"id": row.id, "to": row.to_email, "subject": row.subject,
+                                 "text": text, "attempts": row.attempts})
+            await db.commit()
+        return messages
+
+    async def record_results(self, messages: List[dict], provider_ids: List[str] = None, error: str = None):
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(EmailOutbox).where(EmailOutbox.id.in_([m["id"] for m in messages]))
+            )
+            rows = {row.id: row for row in result.scalars().all()}
+            for index, message in enumerate(messages):
+                row = rows.get(message["id"])
+                if row is None:
+                    continue
+                if error is None:
+                    row.status = "sent"
+                    row.sent_at = now
+                    row.provider_id = provider_ids[index] if index < len(provider_ids) else None
+                    row.last_error = None
+                    row.text_body = None  # don't keep reset codes around
+                elif row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    row.status = "failed"
+                    row.last_error = error[:500]
+                    row.text_body = None  # never going to be sent
+                else:
+                    row.status = "pending"
+                    row.next_attempt_at = now + self.backoff(row.attempts)
+                    row.last_error = error[:500]
+            await db.commit()
+
+    async def dispatch_once(self) -> int:
+        """Send one batch; returns the number of rows claimed"""
+        messages = await self.claim_batch()
+        if not messages:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            provider_ids = await self.transport.send_batch(messages)
+        except Exception as e:
+            observe_email(self.transport.name, False, started, len(messages))
+            logger.error("❌ Outbox batch of %d failed: %s", len(messages), e)
+            await self.record_results(messages, error=str(e))
+        else:
+            observe_email(self.transport.name, True, started, len(messages))
+            logger.info("📨 Outbox sent %d email(s)", len(messages), extra=SAMPLED)
+            await self.record_results(messages, provider_ids=provider_ids)
+        return len(messages)
+
+    def wake(self):
+        """Ask the dispatcher to poll now instead of waiting for the interval"""
+        self._wake.set()
+
+    async def run(self):
+        while not self._stopping:
+            try:
+                claimed = await self.dispatch_once()
+            except Exception as e:
+                logger.error("❌ Outbox dispatcher error: %s", e)
+                claimed = 0
+            if claimed >= OUTBOX_BATCH_SIZE:
+                continue  # more work is probably waiting
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self._stopping = True
+        self.wake()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+
+# Global instance
+outbox_dispatcher = OutboxDispatcher()
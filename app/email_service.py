@@ -1,42 +1,160 @@
 # app/email_service.py - UPDATED FOR RESEND API
 import os
+import asyncio
 import logging
-from typing import Tuple
-import resend
+import time
+from typing import List, Tuple
+from .config import (
+    EMAIL_TRANSPORT,
+    RESEND_API_URL,
+    RESEND_HTTP2,
+    RESEND_MAX_CONNECTIONS,
+    RESEND_KEEPALIVE_SECONDS,
+    RESEND_CONNECT_TIMEOUT,
+    RESEND_TIMEOUT,
+    RESEND_BREAKER_FAILURES,
+    RESEND_BREAKER_RESET_SECONDS,
+)
+from .logging_setup import SAMPLED
+from .metrics import observe_email
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class CircuitOpenError(RuntimeError):
+    """Raised while the Resend circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures.
+    After `reset_seconds` one trial call is let through (half-open).
+    """
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_in_progress):
+            raise CircuitOpenError("Resend circuit breaker is open")
+        if state == "half_open":
+            self.trial_in_progress = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_progress = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class AsyncResendClient:
+    """
+    Shared keep-alive (HTTP/2 when available) client for the Resend REST API.
+    One instance per process, so emails reuse the same TLS connections.
+    """
+    def __init__(self, api_key: str, base_url: str = RESEND_API_URL):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.breaker = CircuitBreaker(RESEND_BREAKER_FAILURES, RESEND_BREAKER_RESET_SECONDS)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx  # imported on first send, not at startup
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=RESEND_HTTP2,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(
+                    max_connections=RESEND_MAX_CONNECTIONS,
+                    max_keepalive_connections=RESEND_MAX_CONNECTIONS,
+                    keepalive_expiry=RESEND_KEEPALIVE_SECONDS,
+                ),
+                timeout=httpx.Timeout(RESEND_TIMEOUT, connect=RESEND_CONNECT_TIMEOUT),
+            )
+        return self._client
+
+    async def post(self, path: str, payload, idempotency_key: str = None):
+        self.breaker.before_call()
+        import httpx
+
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        try:
+            response = await self.client.post(path, json=payload, headers=headers)
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            raise
+        # 5xx and 429 mean Resend is struggling; 4xx is our fault and shouldn't trip the breaker
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        response.raise_for_status()
+        return response.json()
+
+    async def send(self, params: dict) -> dict:
+        return await self.post("/emails", params)
+
+    async def send_batch(self, params: List[dict], idempotency_key: str = None) -> dict:
+        return await self.post("/emails/batch", params, idempotency_key)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
 class ResendEmailService:
     def __init__(self):
         # Get Resend API key from environment
         self.api_key = os.getenv("RESEND_API_KEY", "")
         self.from_email = os.getenv("RESEND_FROM", "onboarding@resend.dev")
         
-        # Configure Resend
-        if self.api_key:
-            resend.api_key = self.api_key
-        else:
-            logger.warning("⚠️ RESEND_API_KEY not found in environment variables")
+        self.transport = EMAIL_TRANSPORT
+        self.http = AsyncResendClient(self.api_key)
+        
+        self._resend = None
         
-        logger.info("=" * 60)
-        logger.info("📧 EMAIL SERVICE - RESEND API VERSION")
-        logger.info("🔧 Using Resend API (No SMTP ports needed)")
-        logger.info(f"🔐 API Key: {'SET' if self.api_key else 'NOT SET'}")
-        logger.info(f"📤 From Email: {self.from_email}")
-        logger.info(f"🌐 Service URL: https://fyp-auth-api.onrender.com")
-        logger.info("=" * 60)
+        if not self.api_key:
+            logger.warning("⚠️ RESEND_API_KEY not found in environment variables")
+    
+    @property
+    def resend(self):
+        """The Resend SDK, imported and configured on first use rather than at startup"""
+        if self._resend is None:
+            import resend
+            
+            # Configure Resend
+            if self.api_key:
+                resend.api_key = self.api_key
+            self._resend = resend
+            
+            logger.info("📧 Resend SDK ready (API key %s, from %s, transport %s)",
+                        "set" if self.api_key else "NOT SET", self.from_email, self.transport)
+        return self._resend
     
     def send_email(self, to_email: str, subject: str, content: str) -> Tuple[int, str]:
         """
         Send email using Resend API
         Returns: (status_code, response_text)
         """
+        started = time.perf_counter()
         try:
-            logger.info(f"📨 Sending email via Resend to: {to_email}")
-            logger.info(f"📝 Subject: {subject}")
-            
             # Make API call to Resend
             params = {
                 "from": self.from_email,
@@ -45,38 +163,95 @@ class ResendEmailService:
                 "text": content
             }
             
-            response = resend.Emails.send(params)
+            response = self.resend.Emails.send(params)
 
-            logger.info(f"📊 Resend Response: Email ID: {response.get('id', 'Unknown')}")
-            logger.info("✅ Email accepted by Resend for delivery")
+            logger.info("✅ Email accepted by Resend: %s", response.get("id", "Unknown"), extra=SAMPLED)
+            observe_email("sdk", True, started)
             
             return 202, f"Email queued: {response.get('id', 'Unknown')}"
             
         except Exception as e:   # ✅ FIXED — Removed resend.ResendError
-            logger.error(f"❌ Unexpected error: {e}")
+            logger.error("❌ Unexpected error sending email: %s", e)
+            observe_email("sdk", False, started)
             return 500, f"Unexpected error: {str(e)}"
     
     def send_password_reset_email(self, to_email: str, reset_token: str, user_name: str) -> bool:
         """
         Send password reset email with reset token using Resend
         """
-        logger.info(f"\n{'='*60}")
-        logger.info(f"🚀 SENDING PASSWORD RESET EMAIL")
-        logger.info(f"📧 To: {to_email}")
-        logger.info(f"👤 User: {user_name}")
-        logger.info(f"🔢 Token: {reset_token}")
-        logger.info(f"🔄 Using Resend API")
-        logger.info(f"{'='*60}")
-        
         # Check if API key is configured
         if not self.api_key:
             logger.error("❌ Resend API Key not configured!")
-            logger.info(f"📝 Token for debugging: {reset_token}")
             return False
         
-        # Create email content
-        subject = "Password Reset Code - Sure Step App"
+        message = self.build_password_reset_email(to_email, reset_token, user_name)
+        
+        # Send email using Resend API
+        status_code, response_text = self.send_email(to_email, message["subject"], message["text"])
+        
+        # Check if email was successfully sent
+        if status_code == 202:
+            logger.info("🎉 Password reset email sent", extra=SAMPLED)
+            return True
+        else:
+            logger.error("❌ Failed to send email. Status: %s, response: %s", status_code, response_text)
+            return False
+    
+    async def send_email_async(self, to_email: str, subject: str, content: str) -> Tuple[int, str]:
+        """
+        Send email without blocking the event loop.
+        Uses the pooled HTTP client when EMAIL_TRANSPORT=http, otherwise the SDK in a thread.
+        Returns: (status_code, response_text)
+        """
+        if self.transport != "http":
+            return await asyncio.to_thread(self.send_email, to_email, subject, content)
+        import httpx
+        
+        started = time.perf_counter()
+        try:
+            response = await self.http.send({
+                "from": self.from_email,
+                "to": [to_email],
+                "subject": subject,
+                "text": content
+            })
+            logger.info("✅ Email accepted by Resend: %s", response.get("id", "Unknown"), extra=SAMPLED)
+            observe_email("http", True, started)
+            return 202, f"Email queued: {response.get('id', 'Unknown')}"
+        except CircuitOpenError as e:
+            logger.error("❌ %s", e)
+            observe_email("http", False, started)
+            return 503, str(e)
+        except httpx.HTTPStatusError as e:
+            logger.error("❌ Resend returned %s", e.response.status_code)
+            observe_email("http", False, started)
+            return e.response.status_code, e.response.text
+        except Exception as e:
+            logger.error("❌ Unexpected error sending email: %s", e)
+            observe_email("http", False, started)
+            return 500, f"Unexpected error: {str(e)}"
+    
+    async def send_password_reset_email_async(self, to_email: str, reset_token: str, user_name: str) -> bool:
+        """
+        Async version of send_password_reset_email
+        """
+        if not self.api_key:
+            logger.error("❌ Resend API Key not configured!")
+            return False
+        
+        message = self.build_password_reset_email(to_email, reset_token, user_name)
+        status_code, response_text = await self.send_email_async(to_email, message["subject"], message["text"])
         
+        if status_code == 202:
+            logger.info("🎉 Password reset email sent", extra=SAMPLED)
+            return True
+        logger.error("❌ Failed to send email. Status: %s, response: %s", status_code, response_text)
+        return False
+    
+    def build_password_reset_email(self, to_email: str, reset_token: str, user_name: str) -> dict:
+        """
+        Build the Resend params for a password reset email (used by the outbox)
+        """
         text_content = f"""Password Reset Request
 
 Hello {user_name},
@@ -92,19 +267,12 @@ If you didn't request this, please ignore this email.
 Thanks,
 Sure Step Team
 """
-        
-        # Send email using Resend API
-        status_code, response_text = self.send_email(to_email, subject, text_content)
-        
-        # Check if email was successfully sent
-        if status_code == 202:
-            logger.info(f"🎉 Password reset email sent successfully to {to_email}")
-            return True
-        else:
-            logger.error(f"❌ Failed to send email. Status: {status_code}")
-            logger.error(f"📝 Response: {response_text}")
-            logger.info(f"📝 Token for debugging: {reset_token}")
-            return False
+        return {
+            "from": self.from_email,
+            "to": [to_email],
+            "subject": "Password Reset Code - Sure Step App",
+            "text": text_content
+        }
     
     def get_configuration_status(self) -> dict:
         """Return email service configuration status"""
@@ -114,6 +282,8 @@ Sure Step Team
             "api_key_set": bool(self.api_key),
             "api_key_length": len(self.api_key) if self.api_key else 0,
             "from_email": self.from_email,
+            "transport": self.transport,
+            "circuit_breaker": self.http.breaker.state,
             "uses_smtp": False,
             "uses_api": True,
             "port_requirements": "None (API based)",
@@ -0,0 +1,217 @@
+# app/idempotency.py - Idempotency-Key replay cache for retried POSTs
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import delete, select
+
+from .config import SECRET_KEY, IDEMPOTENCY_STORE, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_KEYS
+from .db import AsyncSessionLocal
+from .models import IdempotencyRecord
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+# 4xx answers that tell the client to try again: storing one would replay it
+# for every retry with the same key, so they're passed through like 5xx
+_RETRYABLE = {409, 429}
+
+_HMAC_KEY = (SECRET_KEY + ":idempotency").encode("utf-8")
+
+
+def _digest(value: str) -> str:
+    # Keyed: the request bodies hashed here contain passwords
+    return hmac.new(_HMAC_KEY, value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class StoredResponse(NamedTuple):
+    request_digest: str
+    status_code: int
+    body: bytes
+    expires_at: float  # epoch seconds
+
+
+class IdempotencyStore(ABC):
+    """Interface shared by the in-memory and database stores"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def put(self, key: str, response: StoredResponse):
+        """Keep the first response stored under a key; later puts for it are ignored"""
+        raise NotImplementedError
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Per-process LRU of at most `max_keys` responses, each dropped at its expiry"""
+
+    def __init__(self, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.max_keys = max_keys
+        self._responses: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            response = self._responses.get(key)
+            if response is None:
+                return None
+            if response.expires_at <= time.time():
+                del self._responses[key]
+                return None
+            self._responses.move_to_end(key)
+            return response
+
+    async def put(self, key: str, response: StoredResponse):
+        with self._lock:
+            self._responses.setdefault(key, response)
+            while len(self._responses) > self.max_keys:
+                self._responses.popitem(last=False)
+
+
+class DatabaseIdempotencyStore(IdempotencyStore):
+    """
+    idempotency_keys table, so a retry that lands on another worker is replayed
+    too. Reads and writes use their own session: the stored response must
+    survive whatever the request's transaction did. Recent keys are also kept
+    in memory, so a replay on the same worker runs no SQL.
+    """
+
+    # Expired rows are deleted a batch at a time, every this many puts
+    PURGE_EVERY = 100
+    PURGE_BATCH = 500
+
+    def __init__(self):
+        self.local = MemoryIdempotencyStore()
+        self._puts = 0
+
+    def _insert(self, db):
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(IdempotencyRecord)
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        response = await self.local.get(key)
+        if response is not None:
+            return response
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(IdempotencyRecord.request_digest, IdempotencyRecord.status_code,
+                       IdempotencyRecord.body, IdempotencyRecord.expires_at)
+                .where(IdempotencyRecord.key == key, IdempotencyRecord.expires_at > datetime.utcnow())
+            )
+            row = result.first()
+        if row is None:
+            return None
+        expires_at = time.time() + (row.expires_at - datetime.utcnow()).total_seconds()
+        response = StoredResponse(row.request_digest, row.status_code, row.body.encode("utf-8"), expires_at)
+        await self.local.put(key, response)
+        return response
+
+    async def put(self, key: str, response: StoredResponse):
+        await self.local.put(key, response)
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                self._insert(db).values(
+                    key=key,
+                    request_digest=response.request_digest,
+                    status_code=response.status_code,
+                    body=response.body.decode("utf-8"),
+                    expires_at=now + timedelta(seconds=response.expires_at - time.time()),
+                    created_at=now,
+                ).on_conflict_do_nothing(index_elements=["key"])
+            )
+            self._puts += 1
+            if self._puts % self.PURGE_EVERY == 0:
+                expired = (
+                    select(IdempotencyRecord.key)
+                    .where(IdempotencyRecord.expires_at < now)
+                    .limit(self.PURGE_BATCH)
+                    .scalar_subquery()
+                )
+                await db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.key.in_(expired)))
+            await db.commit()
+
+
+def _replay(response: StoredResponse, replayed: bool) -> Response:
+    headers = {"Idempotent-Replayed": "true"} if replayed else None
+    return Response(response.body, status_code=response.status_code,
+                    media_type="application/json", headers=headers)
+
+
+async def idempotent(scope: str, key: Optional[str], payload: BaseModel,
+                     handler: Callable[[], Awaitable[dict]]):
+    """
+    Run `handler` once per Idempotency-Key. The response (success or a final
+    4xx HTTPException) is stored for IDEMPOTENCY_TTL_SECONDS and replayed for
+    retries with the same key and body, without hashing or touching the
+    request's session. Concurrent duplicates on this worker wait for the first.
+    5xx, 409/429 and other exceptions aren't stored, so those retries run again.
+    Without a key the handler just runs.
+    """
+    if key is None:
+        return await handler()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Invalid Idempotency-Key header")
+
+    storage_key = _digest(f"{scope}:{key}")
+    request_digest = _digest(payload.json(sort_keys=True))
+
+    ran = False
+
+    async def run() -> Tuple[StoredResponse, bool]:
+        """(response, whether it came from the store); only the flight's leader runs this"""
+        nonlocal ran
+        ran = True
+        stored = await idempotency_store.get(storage_key)
+        if stored is not None:
+            if not hmac.compare_digest(stored.request_digest, request_digest):
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+            return stored, True
+
+        try:
+            status_code, content = 200, await handler()
+        except HTTPException as e:
+            if e.status_code >= 500 or e.status_code in _RETRYABLE:
+                raise
+            status_code, content = e.status_code, {"detail": e.detail}
+
+        body = json.dumps(jsonable_encoder(content)).encode("utf-8")
+        stored = StoredResponse(request_digest, status_code, body, time.time() + IDEMPOTENCY_TTL_SECONDS)
+        try:
+            await idempotency_store.put(storage_key, stored)
+        except Exception as e:
+            # The work is done either way; a retry just won't be deduplicated
+            logger.error("❌ Could not store idempotent response: %s", e)
+        return stored, False
+
+    # The body is part of the flight key: a different request under the same key
+    # mustn't be handed this one's response
+    stored, from_store = await _flights.do(f"{storage_key}:{request_digest}", run)
+    # A concurrent duplicate that waited on the leader got a replay too
+    return _replay(stored, replayed=from_store or not ran)
+
+
+_flights = SingleFlight("idempotency")
+
+# Global instance
+idempotency_store = DatabaseIdempotencyStore() if IDEMPOTENCY_STORE == "database" else MemoryIdempotencyStore()
@@ -0,0 +1,161 @@
+# app/keys.py - JWT signing keys: the HS256 shared secret or an asymmetric key ring
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+from .config import (
+    SECRET_KEY,
+    JWT_ALGORITHM,
+    JWT_KEY_DIR,
+    JWT_PRIVATE_KEY,
+    JWT_KEY_ID,
+    ENVIRONMENT,
+)
+
+logger = logging.getLogger(__name__)
+
+ASYMMETRIC_ALGORITHMS = ("EdDSA", "ES256")
+
+
+class SigningKey:
+    """A parsed private key and its public half, kept in memory for the process lifetime"""
+
+    def __init__(self, kid: str, private_key, algorithm: str):
+        if algorithm == "EdDSA" and not isinstance(private_key, ed25519.Ed25519PrivateKey):
+            raise RuntimeError(f"JWT key {kid!r} is not an Ed25519 key (required for EdDSA)")
+        if algorithm == "ES256" and not (
+            isinstance(private_key, ec.EllipticCurvePrivateKey)
+            and isinstance(private_key.curve, ec.SECP256R1)
+        ):
+            raise RuntimeError(f"JWT key {kid!r} is not a P-256 key (required for ES256)")
+        self.kid = kid
+        self.algorithm = algorithm
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+
+    def jwk(self) -> dict:
+        jwk = json.loads(jwt.get_algorithm_by_name(self.algorithm).to_jwk(self.public_key))
+        jwk.update(kid=self.kid, alg=self.algorithm, use="sig")
+        return jwk
+
+
+def key_id(private_key) -> str:
+    """Stable default kid: a short hash of the public key"""
+    public_der = private_key.public_key().public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(public_der).hexdigest()[:16]
+
+
+def generate_private_key(algorithm: str):
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+def private_key_pem(private_key) -> str:
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode("ascii")
+
+
+class KeyRing:
+    """
+    Signs with the active key and verifies with any key in the ring, matched by
+    the token's `kid` header. With HS256 it falls back to SECRET_KEY and
+    publishes no keys.
+    """
+
+    def __init__(self, algorithm: str, keys: List[SigningKey] = (), active_kid: Optional[str] = None):
+        self.algorithm = algorithm
+        self.keys: Dict[str, SigningKey] = {key.kid: key for key in keys}
+        self.asymmetric = algorithm in ASYMMETRIC_ALGORITHMS
+        if self.asymmetric:
+            if not self.keys:
+                raise RuntimeError(f"JWT_ALGORITHM={algorithm} needs at least one private key")
+            if active_kid is None:
+                if len(self.keys) > 1:
+                    # Guessing (e.g. the newest file) would switch to a key consumers
+                    # haven't fetched yet on the deploy that first publishes it
+                    raise RuntimeError(
+                        f"{len(self.keys)} JWT keys ({', '.join(sorted(self.keys))}) but no JWT_KEY_ID; "
+                        f"set it to the key that should sign"
+                    )
+                active_kid = keys[0].kid
+            if active_kid not in self.keys:
+                raise RuntimeError(f"JWT_KEY_ID {active_kid!r} is not in the key ring")
+        self.active = self.keys.get(active_kid)
+        self._jwks = None
+
+    def sign(self, payload: dict) -> str:
+        if not self.asymmetric:
+            return jwt.encode(payload, SECRET_KEY, algorithm=self.algorithm)
+        return jwt.encode(payload, self.active.private_key, algorithm=self.algorithm,
+                          headers={"kid": self.active.kid})
+
+    def decode(self, token: str, **kwargs) -> dict:
+        """jwt.decode against the right key; raises jwt.InvalidTokenError subclasses"""
+        if not self.asymmetric:
+            return jwt.decode(token, SECRET_KEY, algorithms=[self.algorithm], **kwargs)
+        key = self.keys.get(jwt.get_unverified_header(token).get("kid"))
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        return jwt.decode(token, key.public_key, algorithms=[self.algorithm], **kwargs)
+
+    def jwks(self):
+        """(JWK Set JSON, ETag) for the public keys; computed once, the ring doesn't change at runtime"""
+        if self._jwks is None:
+            body = json.dumps({"keys": [key.jwk() for key in self.keys.values()]}).encode("utf-8")
+            self._jwks = body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        return self._jwks
+
+    @classmethod
+    def from_config(cls) -> "KeyRing":
+        if JWT_ALGORITHM not in ASYMMETRIC_ALGORITHMS:
+            return cls(JWT_ALGORITHM)
+
+        keys = []
+        if JWT_KEY_DIR:
+            for name in sorted(os.listdir(JWT_KEY_DIR)):
+                if name.endswith(".pem"):
+                    with open(os.path.join(JWT_KEY_DIR, name), "rb") as f:
+                        private_key = serialization.load_pem_private_key(f.read(), password=None)
+                    keys.append(SigningKey(name[:-4], private_key, JWT_ALGORITHM))
+        if JWT_PRIVATE_KEY:
+            private_key = serialization.load_pem_private_key(JWT_PRIVATE_KEY.encode("ascii"), password=None)
+            # JWT_KEY_ID names this key unless it already refers to one from JWT_KEY_DIR
+            kid = JWT_KEY_ID if JWT_KEY_ID and JWT_KEY_ID not in {k.kid for k in keys} else key_id(private_key)
+            keys.append(SigningKey(kid, private_key, JWT_ALGORITHM))
+
+        if not keys:
+            if ENVIRONMENT == "production":
+                raise RuntimeError(f"JWT_ALGORITHM={JWT_ALGORITHM} but no JWT_KEY_DIR or JWT_PRIVATE_KEY is set")
+            # Local runs: a throwaway key, so tokens don't survive a restart
+            private_key = generate_private_key(JWT_ALGORITHM)
+            keys.append(SigningKey(key_id(private_key), private_key, JWT_ALGORITHM))
+            logger.warning("⚠️ No JWT signing key configured; generated a temporary one")
+
+        ring = cls(JWT_ALGORITHM, keys, JWT_KEY_ID or None)
+        logger.info("🔑 JWT key ring: %d key(s), signing with %s (%s)", len(keys), ring.active.kid, JWT_ALGORITHM)
+        return ring
+
+
+_key_ring = None
+_key_ring_lock = threading.Lock()
+
+
+def get_key_ring() -> KeyRing:
+    """Built on first use (first token issued or verified, or the JWKS endpoint)"""
+    global _key_ring
+    if _key_ring is None:
+        with _key_ring_lock:
+            if _key_ring is None:
+                _key_ring = KeyRing.from_config()
+    return _key_ring
@@ -0,0 +1,201 @@
+# app/metrics.py - Prometheus metrics for requests and each stage of the auth path
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Buckets sized for this service: most stages sit between 1 ms and a few seconds
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency",
+    ["method", "route", "status"], buckets=_BUCKETS,
+)
+HASH_DURATION = Histogram(
+    "argon2_duration_seconds", "Argon2 work per call, including worker-pool queueing",
+    ["operation"], buckets=_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Time spent executing SQL statements",
+    ["engine", "statement"], buckets=_BUCKETS,
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    ["engine"], buckets=(0.0001, 0.0005) + _BUCKETS,
+)
+DB_POOL_EXHAUSTED = Counter(
+    "db_pool_exhausted_total", "Checkouts that timed out waiting for a connection", ["engine"],
+)
+DB_REPLICA_READS = Counter(
+    "db_replica_reads_total", "SELECTs routed to a read replica", ["replica"],
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds", "Time admitted requests waited for a concurrency slot",
+    ["route"], buckets=(0.0001, 0.0005) + _BUCKETS,
+)
+ADMISSION_SHED = Counter(
+    "admission_shed_total", "Requests refused with 503 by admission control", ["route", "reason"],
+)
+EMAIL_SEND_DURATION = Histogram(
+    "email_send_duration_seconds", "Email provider call latency",
+    ["transport", "outcome"], buckets=_BUCKETS,
+)
+EMAILS_SENT = Counter(
+    "emails_total", "Emails handed to the provider", ["transport", "outcome"],
+)
+AUTH_CACHE_LOOKUPS = Counter(
+    "auth_cache_lookups_total", "get_current_user cache lookups", ["cache", "result"],
+)
+REVOCATION_CHECKS = Counter(
+    "revocation_checks_total", "Access-token session checks against the revocation filter",
+    ["result"],  # clear | revoked | false_positive
+)
+RESET_CODE_REQUESTS = Counter(
+    "reset_code_requests_total", "Forgot-password requests by outcome",
+    ["outcome"],  # issued | cooldown | unknown_email
+)
+SINGLEFLIGHT_COALESCED = Counter(
+    "singleflight_coalesced_total", "Calls that shared an identical in-flight call", ["operation"],
+)
+LOG_RECORDS = Counter(
+    "log_records_total", "Log records by level and fate",
+    ["level", "outcome"],  # queued | sampled_out | dropped (queue full)
+)
+LOG_EMIT_SECONDS = Counter(
+    "log_emit_seconds_total", "Time request code spent handing records to the log queue",
+)
+JWT_ENCODE_DURATION = Histogram(
+    "jwt_encode_duration_seconds", "JWT signing time",
+    ["kind"], buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+
+
+def observe_email(transport: str, ok: bool, started: float, count: int = 1):
+    outcome = "success" if ok else "failure"
+    EMAIL_SEND_DURATION.labels(transport, outcome).observe(time.perf_counter() - started)
+    EMAILS_SENT.labels(transport, outcome).inc(count)
+
+
+# -------------------------------
+# Request middleware
+# -------------------------------
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (cheaper than BaseHTTPMiddleware). Labels by the
+    route template, e.g. /api/login, so path parameters don't explode cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"],
+                getattr(route, "path", None) or "unmatched",
+                str(status["code"]),
+            ).observe(time.perf_counter() - started)
+
+
+# -------------------------------
+# SQLAlchemy hooks and gauges
+# -------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    kind = statement.lstrip().split(" ", 1)[0].lower()
+    engine = "async" if conn.dialect.is_async else "sync"
+    DB_QUERY_DURATION.labels(engine, kind).observe(time.perf_counter() - started)
+
+
+def _handle_error(context):
+    # after_cursor_execute doesn't fire for failed statements
+    conn = context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+class _StateCollector:
+    """Gauges read at scrape time: DB pools, admission gates and the Argon2 worker pool"""
+
+    def collect(self):
+        from .db import built_engines
+
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["engine"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections beyond pool_size", labels=["engine"])
+        size = GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["engine"])
+        for name, engine in built_engines().items():
+            pool = engine.pool
+            if hasattr(pool, "checkedout"):
+                checked_out.add_metric([name], pool.checkedout())
+                overflow.add_metric([name], max(pool.overflow(), 0))
+                size.add_metric([name], pool.size())
+        yield checked_out
+        yield overflow
+        yield size
+
+        from .db import _replica_set
+        if _replica_set is not None:
+            yield GaugeMetricFamily("db_replicas_healthy", "Read replicas in rotation",
+                                    value=len(_replica_set.healthy))
+
+        from .admission import admission_controller
+        in_flight = GaugeMetricFamily("admission_in_flight", "Requests holding a slot", labels=["route"])
+        waiting = GaugeMetricFamily("admission_waiting", "Requests waiting for a slot", labels=["route"])
+        for path, gate in admission_controller.gates.items():
+            in_flight.add_metric([path], gate.in_flight)
+            waiting.add_metric([path], gate.waiting)
+        yield in_flight
+        yield waiting
+
+        from .auth import get_hash_pool_metrics
+        stats = get_hash_pool_metrics()
+        yield GaugeMetricFamily("argon2_pool_in_flight", "Hash jobs running or queued", value=stats["in_flight"])
+        yield GaugeMetricFamily("argon2_pool_queued", "Hash jobs waiting for a worker", value=stats["queued"])
+        yield CounterMetricFamily("argon2_pool_rejected", "Hash jobs rejected (queue full)", value=stats["rejected"])
+
+
+_installed = False
+
+
+def install():
+    """
+    Attach the SQLAlchemy listeners and scrape-time collectors (idempotent).
+    Listeners go on the Engine class, so engines created later are covered too.
+    """
+    global _installed
+    if _installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    REGISTRY.register(_StateCollector())
+    _installed = True
+
+
+def render_metrics():
+    """(body, content type) for the /metrics endpoint"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,362 @@
+# app/migrations.py - versioned schema migrations that are safe on a live database
+"""
+Each Migration is a numbered list of idempotent steps. Applied versions are
+recorded in schema_migrations (with how long they took); `migrate()` runs
+the pending ones in order. A migration is recorded only after all of its
+steps succeed, and because every step checks before it changes anything, a
+run that died halfway is simply run again.
+
+Online-safety on PostgreSQL:
+  * DDL runs with a short lock_timeout, so an ALTER waiting behind a long
+    transaction gives up instead of queueing every login behind it
+  * indexes are built with CREATE INDEX CONCURRENTLY (outside a transaction);
+    an invalid index left by an interrupted build is dropped and rebuilt
+  * backfills walk the primary key in bounded ranges, commit each batch and
+    pause between batches
+  * a session advisory lock keeps two deploys from migrating at once
+
+Run it with `python migrate_database.py [--dry-run]`.
+"""
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import inspect, text
+
+from .models import Base
+
+# pg_advisory_lock key ("migr" in ASCII)
+_ADVISORY_LOCK = 0x6D696772
+
+_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP NOT NULL,
+    duration_ms INTEGER NOT NULL
+)
+"""
+
+
+class Options(NamedTuple):
+    dry_run: bool = False
+    lock_timeout: str = "5s"
+    batch_size: int = 1000
+    pause: float = 0.05  # seconds between backfill batches
+    out: Callable[[str], None] = print
+
+
+# -------------------------------
+# Steps
+# -------------------------------
+
+class Step(ABC):
+    """One idempotent change. `dialects` limits it to some databases (None = all)."""
+
+    dialects = None
+
+    def applies(self, dialect: str) -> bool:
+        return self.dialects is None or dialect in self.dialects
+
+    @abstractmethod
+    def describe(self, dialect: str) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def run(self, engine, options: Options) -> Optional[str]:
+        """Apply the change if needed; returns a short note for the log"""
+        raise NotImplementedError
+
+
+def _ddl(engine, options: Options, statement: str):
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(f"SET LOCAL lock_timeout = '{options.lock_timeout}'"))
+        conn.execute(text(statement))
+
+
+class CreateTables(Step):
+    """Tables in app.models that don't exist yet (checkfirst), with their indexes"""
+
+    def describe(self, dialect: str) -> str:
+        return "CREATE TABLE for models without a table"
+
+    def run(self, engine, options: Options) -> Optional[str]:
+        inspector = inspect(engine)
+        missing = [name for name in Base.metadata.tables if not inspector.has_table(name)]
+        if not missing:
+            return "all tables exist"
+        Base.metadata.create_all(bind=engine, tables=[Base.metadata.tables[name] for name in missing])
+        return f"created {', '.join(missing)}"
+
+
+class AddColumn(Step):
+    def __init__(self, table: str, column: str, ddl: str, dialects=None):
+        self.table, self.column, self.ddl, self.dialects = table, column, ddl, dialects
+
+    def describe(self, dialect: str) -> str:
+        return f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.ddl}"
+
+    def run(self, engine, options: Options) -> Optional[str]:
+        columns = {c["name"] for c in inspect(engine).get_columns(self.table)}
+        if self.column in columns:
+            return "already there"
+        _ddl(engine, options, self.describe(engine.dialect.name))
+        return None
+
+
+class CreateIndex(Step):
+    """CREATE INDEX CONCURRENTLY on PostgreSQL (no write lock on the table), plain elsewhere"""
+
+    def __init__(self, name: str, table: str, expressions: str, unique: bool = False, where: str = None):
+        self.name, self.table, self.expressions = name, table, expressions
+        self.unique, self.where = unique, where
+
+    def describe(self, dialect: str) -> str:
+        concurrently = " CONCURRENTLY" if dialect == "postgresql" else ""
+        unique = "UNIQUE " if self.unique else ""
+        where = f" WHERE {self.where}" if self.where else ""
+        return f"CREATE {unique}INDEX{concurrently} IF NOT EXISTS {self.name} ON {self.table} ({self.expressions}){where}"
+
+    def run(self, engine, options: Options) -> Optional[str]:
+        if engine.dialect.name != "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text(self.describe(engine.dialect.name)))
+            return None
+
+        # CONCURRENTLY can't run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            valid = conn.execute(text(
+                "SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name"
+            ), {"name": self.name}).scalar()
+            if valid:
+                return "already there"
+            if valid is False:
+                # Left behind by an interrupted build: IF NOT EXISTS would keep the broken index
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name}"))
+            conn.execute(text("SET statement_timeout = 0"))
+            conn.execute(text(f"SET lock_timeout = '{options.lock_timeout}'"))
+            conn.execute(text(self.describe("postgresql")))
+        return "rebuilt invalid index" if valid is False else None
+
+
+class DropIndex(Step):
+    """DROP INDEX CONCURRENTLY on PostgreSQL, plain elsewhere"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def describe(self, dialect: str) -> str:
+        concurrently = " CONCURRENTLY" if dialect == "postgresql" else ""
+        return f"DROP INDEX{concurrently} IF EXISTS {self.name}"
+
+    def run(self, engine, options: Options) -> Optional[str]:
+        if engine.dialect.name != "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text(self.describe(engine.dialect.name)))
+            return None
+
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"SET lock_timeout = '{options.lock_timeout}'"))
+            conn.execute(text(self.describe("postgresql")))
+        return None
+
+
+class AddCheck(Step):
+    """
+    ADD CONSTRAINT ... CHECK ... NOT VALID: new writes are checked right away
+    and the table isn't scanned under the ALTER's lock. NOT VALID still checks
+    every UPDATE, old rows included, so backfill before this step (and again
+    after it), then validate (SQL step with VALIDATE CONSTRAINT, which doesn't
+    block writes).
+    PostgreSQL only: SQLite can't add a constraint to an existing table.
+    """
+
+    dialects = {"postgresql"}
+
+    def __init__(self, table: str, name: str, condition: str):
+        self.table, self.name, self.condition = table, name, condition
+
+    def describe(self, dialect: str) -> str:
+        return f"ALTER TABLE {self.table} ADD CONSTRAINT {self.name} CHECK ({self.condition}) NOT VALID"
+
+    def run(self, engine, options: Options) -> Optional[str]:
+        names = {c["name"] for c in inspect(engine).get_check_constraints(self.table)}
+        if self.name in names:
+            return "already there"
+        _ddl(engine, options, self.describe(engine.dialect.name))
+        return None
+
+
+class Require(Step):
+    """Stops the migration if `query` returns rows (listed in the error), e.g. data a later step can't fix"""
+
+    def __init__(self, query: str, message: str):
+        self.query, self.message = query, message
+
+    def describe(self, dialect: str) -> str:
+        return f"check: {self.message}"
+
+    def run(self, engine, options: Options) -> Optional[str]:
+        with engine.connect() as conn:
+            rows = conn.execute(text(self.query)).all()
+        if rows:
+            raise RuntimeError(f"{self.message}: " + ", ".join(str(row[0]) for row in rows))
+        return "ok"
+
+
+class Backfill(Step):
+    """
+    UPDATE table SET <assignments> WHERE <where>, one primary-key range at a
+    time: each batch is a short transaction touching at most batch_size rows,
+    followed by a pause, so logins never wait long behind it. `where` must be
+    false once a row is done, which makes re-runs cheap.
+    """
+
+    def __init__(self, table: str, assignments: str, where: str, key: str = "id"):
+        self.table, self.assignments, self.where, self.key = table, assignments, where, key
+
+    def describe(self, dialect: str) -> str:
+        return f"UPDATE {self.table} SET {self.assignments} WHERE {self.where} (batched by {self.key})"
+
+    def run(self, engine, options: Options) -> Optional[str]:
+        with engine.connect() as conn:
+            low, high = conn.execute(text(f"SELECT min({self.key}), max({self.key}) FROM {self.table}")).one()
+        if low is None:
+            return "table is empty"
+
+        updated = batches = 0
+        start = low
+        while start <= high:
+            end = start + options.batch_size
+            with engine.begin() as conn:
+                if engine.dialect.name == "postgresql":
+                    conn.execute(text(f"SET LOCAL lock_timeout = '{options.lock_timeout}'"))
+                result = conn.execute(text(
+                    f"UPDATE {self.table} SET {self.assignments} "
+                    f"WHERE {self.key} >= :start AND {self.key} < :end AND ({self.where})"
+                ), {"start": start, "end": end})
+            updated += result.rowcount
+            batches += 1
+            start = end
+            if result.rowcount and options.pause:
+                time.sleep(options.pause)
+        return f"{updated} row(s) in {batches} batch(es)"
+
+
+class SQL(Step):
+    """Any other idempotent statement (IF NOT EXISTS / IF EXISTS), run as DDL"""
+
+    def __init__(self, statement: str, dialects=None):
+        self.statement, self.dialects = statement, dialects
+
+    def describe(self, dialect: str) -> str:
+        return " ".join(self.statement.split())
+
+    def run(self, engine, options: Options) -> Optional[str]:
+        _ddl(engine, options, self.statement)
+        return None
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    steps: List[Step]
+
+
+# -------------------------------
+# Migrations (append only; never renumber or edit an applied one)
+# -------------------------------
+
+MIGRATIONS = [
+    Migration(1, "baseline: tables and the password-reset / ulcer history columns", [
+        CreateTables(),
+        AddColumn("users", "reset_token", "VARCHAR(255)"),
+        AddColumn("users", "reset_token_expiry", "TIMESTAMP"),
+        AddColumn("users", "is_active", "BOOLEAN DEFAULT true"),
+        AddColumn("users", "updated_at", "TIMESTAMP WITH TIME ZONE"),
+        AddColumn("users", "ulcer_history", "JSONB DEFAULT '[]'::JSONB", dialects={"postgresql"}),
+    ]),
+    Migration(2, "normalised emails, unique on lower(email)", [
+        Require(
+            "SELECT lower(trim(email)) FROM users GROUP BY lower(trim(email)) HAVING count(*) > 1 LIMIT 20",
+            "these emails belong to more than one account (differing only in case or spaces); merge them first",
+        ),
+        # Normalise before adding the check: even NOT VALID it applies to every UPDATE,
+        # so the app's writes (rehash on login, /signup/info) to old rows would fail
+        Backfill("users", "email = lower(trim(email))", "email <> lower(trim(email))"),
+        AddCheck("users", "ck_users_email_normalized", "email = lower(trim(email))"),
+        # Rows written by other tools while the first pass ran
+        Backfill("users", "email = lower(trim(email))", "email <> lower(trim(email))"),
+        SQL("ALTER TABLE users VALIDATE CONSTRAINT ck_users_email_normalized", dialects={"postgresql"}),
+        CreateIndex("uq_users_email_lower", "users", "lower(email)", unique=True),
+        # Same uniqueness now that emails are stored normalised: one index to maintain, not two
+        DropIndex("ix_users_email"),
+    ]),
+    Migration(3, "drop the reset-code emails left in failed outbox rows", [
+        Backfill("email_outbox", "text_body = NULL", "status = 'failed' AND text_body IS NOT NULL"),
+    ]),
+]
+
+
+# -------------------------------
+# Runner
+# -------------------------------
+
+def applied_versions(engine, create: bool = True) -> set:
+    if not create and not inspect(engine).has_table("schema_migrations"):
+        return set()
+    with engine.begin() as conn:
+        conn.execute(text(_VERSION_TABLE))
+        return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars().all())
+
+
+def migrate(engine, options: Options = Options(), target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to `target` (default: all); returns the versions applied"""
+    out = options.out
+    dialect = engine.dialect.name
+    lock = None
+    if dialect == "postgresql" and not options.dry_run:
+        lock = engine.connect()
+        lock.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _ADVISORY_LOCK})
+        lock.commit()
+
+    try:
+        done = applied_versions(engine, create=not options.dry_run)
+        pending = [m for m in MIGRATIONS if m.version not in done and (target is None or m.version <= target)]
+        if not pending:
+            out(f"✅ Schema is up to date (version {max(done, default=0)})")
+            return []
+
+        applied = []
+        for migration in pending:
+            out(f"▶ {migration.version:04d} {migration.name}")
+            started = time.perf_counter()
+            for step in migration.steps:
+                if not step.applies(dialect):
+                    continue
+                if options.dry_run:
+                    out(f"    would run: {step.describe(dialect)}")
+                    continue
+                step_started = time.perf_counter()
+                note = step.run(engine, options)
+                elapsed = (time.perf_counter() - step_started) * 1000
+                out(f"    {elapsed:9.1f} ms  {step.describe(dialect)}" + (f"  ({note})" if note else ""))
+            if options.dry_run:
+                continue
+
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at, duration_ms) "
+                         "VALUES (:version, :name, CURRENT_TIMESTAMP, :duration_ms)"),
+                    {"version": migration.version, "name": migration.name, "duration_ms": duration_ms},
+                )
+            out(f"✅ {migration.version:04d} applied in {duration_ms} ms")
+            applied.append(migration.version)
+        return applied
+    finally:
+        if lock is not None:
+            lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK})
+            lock.close()
@@ -1,5 +1,6 @@
 ﻿# app/models.py - CORRECTED VERSION
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, Index, ForeignKey, CheckConstraint
 from sqlalchemy.sql import func
 from .db import Base
 
@@ -9,7 +10,8 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String(50), nullable=False)
     last_name = Column(String(50), nullable=False)
-    email = Column(String(100), unique=True, nullable=False, index=True)
+    # Stored normalised (utils.emails.normalize_email); unique ignoring case, see __table_args__
+    email = Column(String(100), nullable=False)
     username = Column(String(100), unique=True, nullable=False, index=True)
     password_hash = Column(String(255), nullable=False)
     
@@ -26,4 +28,71 @@ class User(Base):
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), nullable=True, onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), nullable=True, onupdate=func.now())
+
+    __table_args__ = (
+        # Every email lookup is WHERE lower(email) = :email (repository.by_email)
+        Index("uq_users_email_lower", func.lower(email), unique=True),
+        CheckConstraint("email = lower(trim(email))", name="ck_users_email_normalized"),
+    )
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String(100), nullable=False)
+    subject = Column(String(255), nullable=False)
+    text_body = Column(Text, nullable=True)  # encrypted (email_outbox._seal); cleared once sent or failed
+
+    # Delivery state: pending -> sending -> sent | failed
+    status = Column(String(20), default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String(500), nullable=True)
+    provider_id = Column(String(100), nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_outbox_due", "status", "next_attempt_at"),
+    )
+
+
+class PasswordResetCode(Base):
+    __tablename__ = "password_reset_codes"
+
+    # One pending code per user; issuing a new one overwrites it
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    code_digest = Column(String(64), nullable=False)  # HMAC-SHA256, never the code itself
+    expires_at = Column(DateTime, nullable=False, index=True)  # sweeper range scans this
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)  # SHA-256 of the opaque token
+    # One family per login; each refresh rotates to a new row in the same family.
+    # Access tokens carry the family as their "sid" claim.
+    family_id = Column(String(32), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    used_at = Column(DateTime, nullable=True)  # rotated; presenting it again revokes the family
+    revoked_at = Column(DateTime, nullable=True, index=True)  # logout / password reset
+
+
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_keys"
+
+    # HMAC of route + Idempotency-Key header; request_digest is an HMAC of the body
+    key = Column(String(64), primary_key=True)
+    request_digest = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    body = Column(Text, nullable=False)  # the JSON response as sent
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
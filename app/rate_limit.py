@@ -0,0 +1,200 @@
+# app/rate_limit.py - token-bucket throttling for login and reset-code checks
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+
+from .config import (
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_REDIS_URL,
+    RATE_LIMIT_SHARDS,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_RULES,
+    TRUST_PROXY_HEADERS,
+    TRUSTED_PROXY_HOPS,
+)
+from .utils.emails import normalize_email
+
+
+class RateLimited(Exception):
+    """Raised when a client is over its limit; main.py turns this into a 429"""
+
+    def __init__(self, retry_after: float, scope: str):
+        super().__init__(f"Rate limit exceeded for {scope}")
+        self.retry_after = retry_after
+        self.scope = scope
+
+
+def parse_rule(rule: str) -> Tuple[float, float]:
+    """'20/60' -> (burst=20, refill rate=20/60 tokens per second)"""
+    count, seconds = rule.split("/")
+    return float(count), float(count) / float(seconds)
+
+
+# -------------------------------
+# Backends
+# -------------------------------
+
+class RateLimitBackend(ABC):
+    """Interface: take `cost` tokens from `key`, return 0 if allowed else seconds to wait"""
+
+    @abstractmethod
+    async def consume(self, key: str, burst: float, rate: float, cost: float = 1.0) -> float:
+        raise NotImplementedError
+
+
+class _Shard:
+    __slots__ = ("lock", "buckets")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [tokens, updated_at, full_at]
+
+
+class MemoryBackend(RateLimitBackend):
+    """
+    Per-process buckets split over shards so one lock doesn't serialize every request.
+    A bucket that has refilled completely is dropped (it is equivalent to a missing
+    one), and each shard keeps at most `max_keys` buckets in LRU order.
+    """
+
+    def __init__(self, shards: int = 16, max_keys: int = 100_000):
+        self.shards = [_Shard() for _ in range(shards)]
+        self.max_keys_per_shard = max(max_keys // shards, 1)
+
+    def _shard(self, key: str) -> _Shard:
+        return self.shards[zlib.crc32(key.encode()) % len(self.shards)]
+
+    def take(self, key: str, burst: float, rate: float, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        shard = self._shard(key)
+        with shard.lock:
+            buckets = shard.buckets
+            bucket = buckets.get(key)
+            if bucket is None:
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                buckets.move_to_end(key)
+
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = 0.0
+            else:
+                retry_after = (cost - tokens) / rate
+            buckets[key] = [tokens, now, now + (burst - tokens) / rate]
+
+            # Least recently used first: drop refilled buckets, then enforce the size cap
+            while buckets:
+                oldest = next(iter(buckets.values()))
+                if oldest[2] <= now or len(buckets) > self.max_keys_per_shard:
+                    buckets.popitem(last=False)
+                else:
+                    break
+        return retry_after
+
+    async def consume(self, key: str, burst: float, rate: float, cost: float = 1.0) -> float:
+        return self.take(key, burst, rate, cost)
+
+    def size(self) -> int:
+        return sum(len(shard.buckets) for shard in self.shards)
+
+
+class RedisBackend(RateLimitBackend):
+    """Shared buckets for multi-worker deployments (needs the optional `redis` package)"""
+
+    _SCRIPT = """
+    local burst = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local now = tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + (now - ts) * rate)
+    local retry = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        retry = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate))
+    return tostring(retry)
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package") from e
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(self._SCRIPT)
+
+    async def consume(self, key: str, burst: float, rate: float, cost: float = 1.0) -> float:
+        retry = await self.script(keys=[f"rl:{key}"], args=[burst, rate, cost, time.time()])
+        return float(retry)
+
+
+# -------------------------------
+# Limiter
+# -------------------------------
+
+class RateLimiter:
+    """
+    Checks every rule configured for a scope (e.g. login:ip, login:email).
+    Call it before any SQL or hashing so rejected requests stay cheap.
+    """
+
+    def __init__(self, backend: RateLimitBackend, rules: Dict[str, str], enabled: bool = True):
+        self.backend = backend
+        self.rules = {name: parse_rule(rule) for name, rule in rules.items()}
+        self.enabled = enabled
+        self.rejected: Dict[str, int] = {}
+
+    async def check(self, scope: str, ip: Optional[str] = None, email: Optional[str] = None):
+        if not self.enabled:
+            return
+        for kind, value in (("ip", ip), ("email", email)):
+            rule = self.rules.get(f"{scope}:{kind}")
+            if rule is None or not value:
+                continue
+            if kind == "email":
+                # Same key as the user lookup (repository.by_email)
+                value = normalize_email(value)
+            burst, rate = rule
+            retry_after = await self.backend.consume(f"{scope}:{kind}:{value}", burst, rate)
+            if retry_after > 0:
+                name = f"{scope}:{kind}"
+                self.rejected[name] = self.rejected.get(name, 0) + 1
+                raise RateLimited(retry_after, name)
+
+
+def client_ip(request: Request) -> str:
+    """
+    Client address. With TRUST_PROXY_HEADERS it's the X-Forwarded-For entry
+    added by our outermost trusted proxy, TRUSTED_PROXY_HOPS from the right:
+    everything left of it was written by the client and can't be trusted.
+    """
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+            if hops:
+                return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+
+def _make_backend() -> RateLimitBackend:
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend(RATE_LIMIT_REDIS_URL)
+    return MemoryBackend(shards=RATE_LIMIT_SHARDS, max_keys=RATE_LIMIT_MAX_KEYS)
+
+
+# Global instance
+rate_limiter = RateLimiter(_make_backend(), RATE_LIMIT_RULES, enabled=RATE_LIMIT_ENABLED)
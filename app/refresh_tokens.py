@@ -0,0 +1,128 @@
+# app/refresh_tokens.py - rotating refresh tokens stored as SHA-256 digests
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import select, update
+
+from .config import REFRESH_TOKEN_DAYS
+from .models import RefreshToken
+from .revocation import revocation_filter
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTokenReused(Exception):
+    """An already-rotated token was presented again; its session has been revoked (uncommitted)"""
+
+    def __init__(self, family_id: str):
+        super().__init__("Refresh token reuse")
+        self.family_ids = [family_id]
+
+
+def token_digest(token: str) -> str:
+    # 256 random bits: a plain hash is enough, no Argon2 needed
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _new_row(user_id: int, family_id: str) -> Tuple[str, RefreshToken]:
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    row = RefreshToken(
+        user_id=user_id,
+        token_hash=token_digest(token),
+        family_id=family_id,
+        created_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_DAYS),
+    )
+    return token, row
+
+
+def issue(db, user_id: int) -> Tuple[str, str]:
+    """Start a new session at login; returns (refresh token, session id). Commit is the caller's."""
+    family_id = uuid4().hex
+    token, row = _new_row(user_id, family_id)
+    db.add(row)
+    return token, family_id
+
+
+async def rotate(db, token: str) -> Optional[Tuple[int, str, str]]:
+    """
+    Swap a refresh token for a new one in the same session; returns
+    (user_id, new refresh token, session id) or None if the token isn't usable.
+    A token that was already rotated is a replay: its whole session is revoked
+    and RefreshTokenReused is raised so the caller commits that and refuses.
+    """
+    now = datetime.utcnow()
+    digest = token_digest(token)
+    result = await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == digest,
+            RefreshToken.used_at.is_(None),
+            RefreshToken.revoked_at.is_(None),
+            RefreshToken.expires_at > now,
+        )
+        .values(used_at=now)
+        .returning(RefreshToken.user_id, RefreshToken.family_id)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
+    if row is None:
+        replayed = await db.execute(
+            select(RefreshToken.user_id, RefreshToken.family_id)
+            .where(RefreshToken.token_hash == digest, RefreshToken.used_at.is_not(None),
+                   RefreshToken.revoked_at.is_(None))
+        )
+        replayed = replayed.first()
+        if replayed is not None:
+            logger.warning("⚠️ Refresh token reuse for user %s; revoking the session", replayed.user_id)
+            await revoke_sessions(db, [replayed.family_id])
+            raise RefreshTokenReused(replayed.family_id)
+        return None
+
+    new_token, new_row = _new_row(row.user_id, row.family_id)
+    db.add(new_row)
+    return row.user_id, new_token, row.family_id
+
+
+async def revoke_sessions(db, family_ids: List[str]) -> List[str]:
+    """Revoke sessions by id. Call `publish` with the result after the commit."""
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id.in_(family_ids), RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return list(family_ids)
+
+
+async def revoke_token_session(db, token: str) -> List[str]:
+    """Logout: revoke the session the refresh token belongs to"""
+    result = await db.execute(
+        select(RefreshToken.family_id).where(RefreshToken.token_hash == token_digest(token))
+    )
+    family_id = result.scalar()
+    return await revoke_sessions(db, [family_id]) if family_id else []
+
+
+async def revoke_user_sessions(db, user_id: int) -> List[str]:
+    """Password reset: revoke every live session of the user"""
+    result = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .returning(RefreshToken.family_id)
+        .execution_options(synchronize_session=False)
+    )
+    return sorted(set(result.scalars().all()))
+
+
+def publish(family_ids: List[str]):
+    """Make committed revocations visible to this process's access-token checks right away"""
+    if family_ids:
+        revocation_filter.add(family_ids)
+
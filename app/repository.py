@@ -0,0 +1,159 @@
+# app/repository.py - lean data access for the routers
+"""
+Each write is a single statement (INSERT/UPDATE ... RETURNING) instead of
+write + refresh, and reads select only the columns the caller uses.
+
+The statements are built once at import with bind parameters, so SQLAlchemy
+compiles each of them once (compiled cache) and asyncpg prepares it once per
+connection (statement cache).
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, bindparam, func, select, text, update
+from sqlalchemy.engine import Row
+
+from .models import User
+from .utils.emails import normalize_email
+
+# Core-style execution: nothing is loaded into the session, so skip the ORM's
+# identity-map synchronisation for bulk UPDATEs
+_NO_SYNC = {"synchronize_session": False}
+
+
+def by_email(email):
+    """
+    WHERE clause for a user by email. It compares lower(email), the expression
+    of the uq_users_email_lower index, so the lookup is an index probe whatever
+    the table size; `email` is normalised here (a bindparam must be bound to a
+    normalised value, as get_credentials does).
+    """
+    if isinstance(email, str):
+        email = normalize_email(email)
+    return func.lower(User.email) == email
+
+
+# Username allocation and insert in one statement. `taken` walks johnsmith,
+# johnsmith2, johnsmith3, ... with one probe of the unique username index per
+# name in use and stops at the first free one (gaps left by deleted accounts
+# are reused). The suffix replaces the tail of a name already at the column
+# limit. ON CONFLICT DO NOTHING: a concurrent signup that took the same email
+# or name makes this return no row instead of raising; the caller retries.
+_USERNAME_LENGTH = User.__table__.c.username.type.length
+_CANDIDATE = (
+    f"CASE WHEN {{n}} = 1 THEN :username "
+    f"ELSE substr(:username, 1, {_USERNAME_LENGTH} - length(CAST({{n}} AS VARCHAR))) || CAST({{n}} AS VARCHAR) END"
+)
+_INSERT_USER = text(f"""
+WITH RECURSIVE taken(n) AS (
+    SELECT 1 WHERE EXISTS (SELECT 1 FROM users WHERE username = :username)
+    UNION ALL
+    SELECT n + 1 FROM taken
+    WHERE EXISTS (SELECT 1 FROM users WHERE username = {_CANDIDATE.format(n="n + 1")})
+)
+INSERT INTO users (first_name, last_name, email, username, password_hash, is_active)
+SELECT :first_name, :last_name, :email, {_CANDIDATE.format(n="free.n")}, :password_hash, true
+FROM (SELECT coalesce(max(n), 0) + 1 AS n FROM taken) AS free
+WHERE true
+ON CONFLICT DO NOTHING
+RETURNING id, email, username
+""").bindparams(*(bindparam(name, type_=String) for name in
+                  ("username", "first_name", "last_name", "email", "password_hash")))
+
+_EMAIL_EXISTS = (
+    select(User.id)
+    .where(by_email(bindparam("email", type_=String)))
+    .limit(1)
+)
+
+_SELECT_CREDENTIALS = (
+    select(User.id, User.password_hash)
+    .where(by_email(bindparam("email", type_=String)))
+)
+
+_SELECT_PROFILE = (
+    select(
+        User.id, User.first_name, User.last_name, User.email, User.username,
+        User.age, User.weight, User.foot_size, User.purpose, User.is_active,
+        User.created_at, User.updated_at,
+    )
+    .where(User.id == bindparam("user_id"))
+)
+
+_UPDATE_INFO = (
+    update(User)
+    .where(User.id == bindparam("user_id"))
+    .values(
+        age=bindparam("new_age"),
+        weight=bindparam("new_weight"),
+        foot_size=bindparam("new_foot_size"),
+        purpose=bindparam("new_purpose"),
+        updated_at=bindparam("new_updated_at"),
+    )
+    .returning(User.id)
+    .execution_options(**_NO_SYNC)
+)
+
+_UPDATE_PASSWORD_HASH = (
+    update(User)
+    .where(User.id == bindparam("user_id"))
+    .values(password_hash=bindparam("new_password_hash"))
+    .execution_options(**_NO_SYNC)
+)
+
+
+async def create_user(db, *, first_name: str, last_name: str, email: str,
+                      username: str, password_hash: str) -> Optional[Row]:
+    """
+    INSERT ... RETURNING id, email, username, under `username` or its first
+    free numbered form. None if the email (or the allocated name) was taken
+    by a concurrent signup: check email_exists, then call again.
+    """
+    result = await db.execute(_INSERT_USER, {
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": normalize_email(email),
+        "username": username,
+        "password_hash": password_hash,
+    })
+    return result.first()
+
+
+async def email_exists(db, email: str) -> bool:
+    result = await db.execute(_EMAIL_EXISTS, {"email": normalize_email(email)})
+    return result.first() is not None
+
+
+async def get_credentials(db, email: str) -> Optional[Row]:
+    """(id, password_hash) for a login, or None"""
+    result = await db.execute(_SELECT_CREDENTIALS, {"email": normalize_email(email)})
+    return result.first()
+
+
+async def get_user_by_email(db, email: str) -> Optional[User]:
+    """The full ORM row (for flows that update it), or None"""
+    result = await db.execute(select(User).where(by_email(email)))
+    return result.scalars().first()
+
+
+async def get_profile(db, user_id: int) -> Optional[Row]:
+    """Everything /api/users/me shows, or None"""
+    result = await db.execute(_SELECT_PROFILE, {"user_id": user_id})
+    return result.first()
+
+
+async def update_info(db, user_id: int, *, age, weight, foot_size, purpose) -> bool:
+    """UPDATE ... RETURNING id; False if the user doesn't exist"""
+    result = await db.execute(_UPDATE_INFO, {
+        "user_id": user_id,
+        "new_age": age,
+        "new_weight": weight,
+        "new_foot_size": foot_size,
+        "new_purpose": purpose,
+        "new_updated_at": datetime.utcnow(),
+    })
+    return result.first() is not None
+
+
+async def update_password_hash(db, user_id: int, password_hash: str):
+    await db.execute(_UPDATE_PASSWORD_HASH, {"user_id": user_id, "new_password_hash": password_hash})
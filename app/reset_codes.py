@@ -0,0 +1,257 @@
+# app/reset_codes.py - storage for 6-digit password reset codes
+import asyncio
+import hashlib
+import hmac
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select, update
+
+from .config import (
+    SECRET_KEY,
+    RESET_CODE_STORE,
+    RESET_CODE_HMAC_KEY,
+    RESET_CODE_TTL_MINUTES,
+    RESET_CODE_MAX_ATTEMPTS,
+    RESET_CODE_SWEEP_SECONDS,
+    RESET_CODE_SWEEP_BATCH,
+)
+from .db import AsyncSessionLocal
+from .models import PasswordResetCode
+
+logger = logging.getLogger(__name__)
+
+# Verification outcomes
+CODE_OK = "ok"
+CODE_MISSING = "missing"
+CODE_EXPIRED = "expired"
+CODE_INVALID = "invalid"
+CODE_LOCKED = "locked"  # too many wrong guesses; the code is discarded
+
+_HMAC_KEY = (RESET_CODE_HMAC_KEY or SECRET_KEY + ":password-reset-codes").encode("utf-8")
+
+
+def code_digest(user_id: int, code: str) -> str:
+    """
+    Keyed hash of a reset code. A 6-digit code has only 10^6 values, so a slow
+    hash adds nothing against an attacker who has the table; the secret key does.
+    """
+    return hmac.new(_HMAC_KEY, f"{user_id}:{code}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class ResetCodeStore(ABC):
+    """Interface shared by the database and in-memory stores"""
+
+    @abstractmethod
+    async def issue(self, db, user_id: int, code: str, cooldown: float = 0) -> Optional[datetime]:
+        """
+        Store a new code for the user (replacing any pending one); returns its
+        expiry. With a cooldown, a pending code issued less than `cooldown`
+        seconds ago is kept and None is returned.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def pending(self, db, user_id: int) -> Optional[Tuple[datetime, datetime]]:
+        """(issued at, expires at) of the user's unexpired code, or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def verify(self, db, user_id: int, code: str) -> str:
+        """Check and consume a code; returns one of the CODE_* outcomes"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def clear(self, db, user_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def sweep(self, batch_size: int = RESET_CODE_SWEEP_BATCH) -> int:
+        """Delete expired codes; returns how many were removed"""
+        raise NotImplementedError
+
+
+class DatabaseResetCodeStore(ResetCodeStore):
+    """
+    password_reset_codes table keyed by user_id. Writes go through the caller's
+    session so they commit together with the rest of the request.
+    """
+
+    def _upsert(self, db):
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(PasswordResetCode)
+
+    async def issue(self, db, user_id: int, code: str, cooldown: float = 0) -> Optional[datetime]:
+        now = datetime.utcnow()
+        expires_at = now + timedelta(minutes=RESET_CODE_TTL_MINUTES)
+        values = {"code_digest": code_digest(user_id, code), "expires_at": expires_at,
+                  "attempts": 0, "created_at": now}
+        stmt = self._upsert(db).values(user_id=user_id, **values)
+        # The cooldown is part of the upsert, so two workers racing can't both issue
+        replaceable = None
+        if cooldown:
+            replaceable = PasswordResetCode.created_at <= now - timedelta(seconds=cooldown)
+        result = await db.execute(
+            stmt.on_conflict_do_update(index_elements=["user_id"], set_=values, where=replaceable)
+            .returning(PasswordResetCode.user_id)
+        )
+        return expires_at if result.first() is not None else None
+
+    async def pending(self, db, user_id: int) -> Optional[Tuple[datetime, datetime]]:
+        result = await db.execute(
+            select(PasswordResetCode.created_at, PasswordResetCode.expires_at)
+            .where(PasswordResetCode.user_id == user_id, PasswordResetCode.expires_at > datetime.utcnow())
+        )
+        row = result.first()
+        return (row.created_at, row.expires_at) if row is not None else None
+
+    async def verify(self, db, user_id: int, code: str) -> str:
+        now = datetime.utcnow()
+        # Happy path is a single statement: consume the code if everything matches
+        consumed = await db.execute(
+            delete(PasswordResetCode)
+            .where(
+                PasswordResetCode.user_id == user_id,
+                PasswordResetCode.code_digest == code_digest(user_id, code),
+                PasswordResetCode.expires_at > now,
+                PasswordResetCode.attempts < RESET_CODE_MAX_ATTEMPTS,
+            )
+            .returning(PasswordResetCode.user_id)
+        )
+        if consumed.first() is not None:
+            return CODE_OK
+
+        # Otherwise count the attempt and work out why it failed
+        result = await db.execute(
+            update(PasswordResetCode)
+            .where(PasswordResetCode.user_id == user_id)
+            .values(attempts=PasswordResetCode.attempts + 1)
+            .returning(PasswordResetCode.attempts, PasswordResetCode.expires_at)
+        )
+        row = result.first()
+        if row is None:
+            return CODE_MISSING
+        if row.expires_at <= now or row.attempts >= RESET_CODE_MAX_ATTEMPTS:
+            await self.clear(db, user_id)
+            return CODE_EXPIRED if row.expires_at <= now else CODE_LOCKED
+        return CODE_INVALID
+
+    async def clear(self, db, user_id: int):
+        await db.execute(delete(PasswordResetCode).where(PasswordResetCode.user_id == user_id))
+
+    async def sweep(self, batch_size: int = RESET_CODE_SWEEP_BATCH) -> int:
+        """Delete expired rows in bounded batches so no statement holds locks for long"""
+        total = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                expired = (
+                    select(PasswordResetCode.user_id)
+                    .where(PasswordResetCode.expires_at < datetime.utcnow())
+                    .limit(batch_size)
+                    .scalar_subquery()
+                )
+                result = await db.execute(
+                    delete(PasswordResetCode).where(PasswordResetCode.user_id.in_(expired))
+                )
+                await db.commit()
+            total += result.rowcount
+            if result.rowcount < batch_size:
+                return total
+
+
+class MemoryResetCodeStore(ResetCodeStore):
+    """Per-process TTL store for local runs and single-worker deployments"""
+
+    def __init__(self):
+        self._codes = {}  # user_id -> [digest, expires_at, attempts, created_at]
+        self._lock = threading.Lock()
+
+    async def issue(self, db, user_id: int, code: str, cooldown: float = 0) -> Optional[datetime]:
+        now = datetime.utcnow()
+        expires_at = now + timedelta(minutes=RESET_CODE_TTL_MINUTES)
+        with self._lock:
+            entry = self._codes.get(user_id)
+            if cooldown and entry is not None and entry[3] > now - timedelta(seconds=cooldown):
+                return None
+            self._codes[user_id] = [code_digest(user_id, code), expires_at, 0, now]
+        return expires_at
+
+    async def pending(self, db, user_id: int) -> Optional[Tuple[datetime, datetime]]:
+        with self._lock:
+            entry = self._codes.get(user_id)
+            if entry is None or entry[1] <= datetime.utcnow():
+                return None
+            return entry[3], entry[1]
+
+    async def verify(self, db, user_id: int, code: str) -> str:
+        with self._lock:
+            entry = self._codes.get(user_id)
+            if entry is None:
+                return CODE_MISSING
+            if entry[1] <= datetime.utcnow():
+                del self._codes[user_id]
+                return CODE_EXPIRED
+            if hmac.compare_digest(entry[0], code_digest(user_id, code)):
+                del self._codes[user_id]
+                return CODE_OK
+            entry[2] += 1
+            if entry[2] >= RESET_CODE_MAX_ATTEMPTS:
+                del self._codes[user_id]
+                return CODE_LOCKED
+            return CODE_INVALID
+
+    async def clear(self, db, user_id: int):
+        with self._lock:
+            self._codes.pop(user_id, None)
+
+    async def sweep(self, batch_size: int = RESET_CODE_SWEEP_BATCH) -> int:
+        now = datetime.utcnow()
+        with self._lock:
+            expired = [user_id for user_id, entry in self._codes.items() if entry[1] <= now]
+            for user_id in expired:
+                del self._codes[user_id]
+        return len(expired)
+
+
+class ResetCodeSweeper:
+    """Periodically removes expired codes; started from main.py"""
+
+    def __init__(self, store: ResetCodeStore, interval: float = RESET_CODE_SWEEP_SECONDS):
+        self.store = store
+        self.interval = interval
+        self._task = None
+
+    async def run(self):
+        while True:
+            try:
+                removed = await self.store.sweep()
+                if removed:
+                    logger.info("🧹 Removed %d expired reset code(s)", removed)
+            except Exception as e:
+                logger.error("❌ Reset code sweep failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global instances
+reset_code_store = MemoryResetCodeStore() if RESET_CODE_STORE == "memory" else DatabaseResetCodeStore()
+reset_code_sweeper = ResetCodeSweeper(reset_code_store)
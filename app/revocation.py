@@ -0,0 +1,172 @@
+# app/revocation.py - in-memory filter of revoked sessions for the access-token hot path
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from .config import JWT_EXP_MIN, REVOCATION_REFRESH_SECONDS, REVOCATION_FILTER_FP_RATE
+from .db import AsyncSessionLocal
+from .metrics import REVOCATION_CHECKS
+from .models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (k positions by double hashing one BLAKE2b digest)"""
+
+    def __init__(self, capacity: int, fp_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationFilter:
+    """
+    Session (refresh-token family) ids revoked within the last access-token
+    lifetime. The filter is rebuilt from the database every
+    REVOCATION_REFRESH_SECONDS; revocations made by this process are added
+    immediately. A filter hit is confirmed with one indexed query, so a
+    false positive never rejects a valid token.
+    """
+
+    def __init__(self, interval: float = REVOCATION_REFRESH_SECONDS, fp_rate: float = REVOCATION_FILTER_FP_RATE):
+        self.interval = interval
+        self.fp_rate = fp_rate
+        self.filter = BloomFilter(1000, fp_rate)
+        self._local = {}      # sid -> revoked at (monotonic), survives the next rebuild
+        self._confirmed = {}  # sid -> (revoked?, checked at) for filter hits
+        self._task = None
+
+    def add(self, session_ids):
+        now = time.monotonic()
+        for sid in session_ids:
+            self.filter.add(sid)
+            self._local[sid] = now
+            self._confirmed[sid] = (True, now)
+
+    async def is_revoked(self, sid: str) -> bool:
+        if sid not in self.filter:
+            REVOCATION_CHECKS.labels("clear").inc()
+            return False
+
+        cached = self._confirmed.get(sid)
+        if cached is None or time.monotonic() - cached[1] > self.interval:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(RefreshToken.id)
+                    .where(RefreshToken.family_id == sid, RefreshToken.revoked_at.is_not(None))
+                    .limit(1)
+                )
+                cached = (result.first() is not None, time.monotonic())
+            self._confirmed[sid] = cached
+        REVOCATION_CHECKS.labels("revoked" if cached[0] else "false_positive").inc()
+        return cached[0]
+
+    async def revoked_among(self, session_ids) -> set:
+        """Batch form of is_revoked: filter hits not confirmed recently are settled in one query"""
+        now = time.monotonic()
+        hits, unconfirmed = [], []
+        for sid in session_ids:
+            if sid not in self.filter:
+                REVOCATION_CHECKS.labels("clear").inc()
+                continue
+            hits.append(sid)
+            cached = self._confirmed.get(sid)
+            if cached is None or now - cached[1] > self.interval:
+                unconfirmed.append(sid)
+
+        if unconfirmed:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(RefreshToken.family_id)
+                    .where(RefreshToken.family_id.in_(unconfirmed), RefreshToken.revoked_at.is_not(None))
+                    .distinct()
+                )
+                found = set(result.scalars().all())
+            for sid in unconfirmed:
+                self._confirmed[sid] = (sid in found, now)
+
+        revoked = {sid for sid in hits if self._confirmed[sid][0]}
+        for sid in hits:
+            REVOCATION_CHECKS.labels("revoked" if sid in revoked else "false_positive").inc()
+        return revoked
+
+    async def rebuild(self):
+        # Older revocations don't matter: every access token from then has expired
+        since = datetime.utcnow() - timedelta(minutes=JWT_EXP_MIN)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(RefreshToken.family_id).where(RefreshToken.revoked_at >= since).distinct()
+            )
+            session_ids = result.scalars().all()
+
+        fresh = BloomFilter(max(1000, len(session_ids) * 2), self.fp_rate)
+        for sid in session_ids:
+            fresh.add(sid)
+        # Local revocations may have committed after the query above ran
+        cutoff = time.monotonic() - 2 * self.interval
+        self._local = {sid: at for sid, at in self._local.items() if at >= cutoff}
+        for sid in self._local:
+            fresh.add(sid)
+        self.filter = fresh
+        self._confirmed = {}
+
+    async def purge_expired(self, batch_size: int = 1000) -> int:
+        """Housekeeping on the same loop: drop refresh rows that expired over a day ago"""
+        async with AsyncSessionLocal() as db:
+            expired = (
+                select(RefreshToken.id)
+                .where(RefreshToken.expires_at < datetime.utcnow() - timedelta(days=1))
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            result = await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(expired)))
+            await db.commit()
+        return result.rowcount
+
+    async def run(self):
+        while True:
+            try:
+                await self.rebuild()
+                await self.purge_expired()
+            except Exception as e:
+                logger.error("❌ Revocation filter rebuild failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global instance
+revocation_filter = RevocationFilter()
@@ -0,0 +1,25 @@
+# app/routers/admin.py - operator endpoints (X-API-Key from ADMIN_API_KEYS)
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from .. import bulk_import
+from ..auth import require_api_key
+from ..config import ADMIN_API_KEYS
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_api_key(ADMIN_API_KEYS, "Admin API"))],
+)
+
+@router.post("/users/import")
+async def import_users(request: Request, format: Literal["csv", "jsonl"] = Query("csv")):
+    """
+    Bulk account creation. The body is CSV with a header row (first_name,
+    last_name, email, password[, confirm_password]) or JSON lines with the same
+    fields, and is read as a stream. Rows that fail validation or already
+    exist are listed in `errors` with their line number; the rest are created.
+    """
+    try:
+        return await bulk_import.import_users(bulk_import.decode_lines(request.stream()), format)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8")
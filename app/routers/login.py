@@ -1,26 +1,54 @@
 # app/routers/login.py - PostgreSQL version (email-based login)
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..schemas import LoginRequest, LoginResponse
-from ..auth import verify_password, create_token
-from ..models import User
-from ..db import get_db
+from ..auth import verify_and_update_async, create_token
+from ..db import get_async_read_db
+from .. import repository, refresh_tokens
+from ..rate_limit import rate_limiter, client_ip
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/login", tags=["login"])
 
 @router.post("", response_model=LoginResponse)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    # Find user by email (instead of username)
-    user = db.query(User).filter(User.email == payload.email).first()
+async def login(payload: LoginRequest, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    # Throttle before any SQL or Argon2 work
+    await rate_limiter.check("login", ip=client_ip(request), email=payload.email)
+    
+    # Find user by email (instead of username); only id and password_hash are needed
+    user = await repository.get_credentials(db, payload.email)
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Verify password
-    if not verify_password(payload.password, user.password_hash):
+    # Verify password in the Argon2 worker pool
+    valid, new_hash = await verify_and_update_async(payload.password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Transparently upgrade outdated hashes (old Argon2 params or SHA-256 fallback)
+    if new_hash:
+        try:
+            await repository.update_password_hash(db, user.id, new_hash)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error("Rehash failed for user %s: %s", user.id, e)
+    
+    # Start a refresh-token session; the access token carries its id for revocation.
+    # Without a stored session there's nothing to revoke it by (logout, password
+    # reset), so no token is handed out
+    refresh_token, session_id = refresh_tokens.issue(db, user.id)
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error("Could not store refresh token for user %s: %s", user.id, e)
+        raise HTTPException(status_code=503, detail="Could not start a session, please retry",
+                            headers={"Retry-After": "1"})
+    
     # Create token
-    token = create_token(user.id)
+    token = create_token(user.id, session_id)
     
-    return LoginResponse(token=token, user_id=user.id)
+    return LoginResponse(token=token, user_id=user.id, refresh_token=refresh_token)
@@ -1,13 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 import logging
 
-from ..db import get_db
+from ..config import RESET_CODE_COOLDOWN_SECONDS, RESET_CODE_TTL_MINUTES
+from ..db import get_async_db, get_async_read_db
+from ..metrics import RESET_CODE_REQUESTS
 from ..models import User
-from ..auth import hash_password, verify_password
+from ..repository import by_email, get_user_by_email
+from ..utils.emails import normalize_email
+from ..auth import hash_password_async, user_cache
 from ..email_service import email_service
+from ..email_outbox import enqueue_password_reset_email, outbox_dispatcher
+from ..idempotency import idempotent
+from ..logging_setup import SAMPLED
 from ..utils.tokens import generate_reset_token, generate_jwt_reset_token, verify_reset_token
+from ..rate_limit import rate_limiter, client_ip
+from ..singleflight import SingleFlight
+from .. import refresh_tokens
+from ..reset_codes import (
+    reset_code_store, CODE_OK, CODE_MISSING, CODE_EXPIRED, CODE_LOCKED
+)
 from ..schemas import ResetPasswordRequest, ForgotPasswordRequest, VerifyResetTokenRequest
 
 logger = logging.getLogger(__name__)
@@ -23,117 +38,134 @@ async def check_email_config():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+def _code_sent(email: str, expires_at: datetime) -> dict:
+    minutes = max(1, round((expires_at - datetime.utcnow()).total_seconds() / 60))
+    return {
+        "message": "Password reset code sent to your email",
+        "status": "success",
+        "expires_in": f"{minutes} minutes",
+        "email_sent_to": email,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# Retry storms (double taps, client retries) for one email share a single run
+_forgot_flights = SingleFlight("password_forgot")
+
 @router.post("/forgot")
 async def forgot_password(
     request: ForgotPasswordRequest,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Step 1: Request password reset
-    """
-    logger.info(f"Password reset requested for email: {request.email}")
     
-    # Find user by email
-    user = db.query(User).filter(User.email == request.email.lower().strip()).first()
+    Concurrent requests for the same email share one run, and a repeat within
+    RESET_CODE_COOLDOWN_SECONDS answers with the pending code's state instead
+    of issuing, storing and emailing another one.
+    """
+    email = normalize_email(request.email)
+    return await _forgot_flights.do(email, lambda: _send_reset_code(email, db))
+
+async def _send_reset_code(email: str, db: AsyncSession) -> dict:
+    # Find user by email (may be served by a read replica; the writes below go to the primary)
+    user = await get_user_by_email(db, email)
     
     if not user:
         # For security, don't reveal if user exists
-        logger.warning(f"Password reset requested for non-existent email: {request.email}")
+        logger.info("Password reset requested for unknown email", extra=SAMPLED)
+        RESET_CODE_REQUESTS.labels("unknown_email").inc()
         return {
             "message": "If your email exists in our system, you will receive a password reset code.",
             "status": "success"
         }
     
-    logger.info(f"User found: {user.id} - {user.email}")
+    # A code sent moments ago is still on its way: don't send another
+    pending = await reset_code_store.pending(db, user.id)
+    if pending is not None and (datetime.utcnow() - pending[0]).total_seconds() < RESET_CODE_COOLDOWN_SECONDS:
+        logger.info("Reset code for user %s is in its cooldown; not sending another", user.id, extra=SAMPLED)
+        RESET_CODE_REQUESTS.labels("cooldown").inc()
+        return _code_sent(user.email, pending[1])
     
     # Generate 6-digit reset token
     reset_token = generate_reset_token()
-    logger.info(f"Generated reset token for {user.email}: {reset_token}")
     
-    # Store token hash in database
-    token_hash = hash_password(reset_token)
-    user.reset_token = token_hash
-    user.reset_token_expiry = datetime.utcnow() + timedelta(minutes=15)
+    # Store a keyed digest of the code (one indexed upsert, no Argon2); the
+    # cooldown is re-checked there in case another worker just issued one
+    expires_at = await reset_code_store.issue(db, user.id, reset_token, RESET_CODE_COOLDOWN_SECONDS)
+    if expires_at is None:
+        await db.rollback()
+        logger.info("Reset code for user %s was issued concurrently; not sending another", user.id, extra=SAMPLED)
+        RESET_CODE_REQUESTS.labels("cooldown").inc()
+        return _code_sent(user.email, datetime.utcnow() + timedelta(minutes=RESET_CODE_TTL_MINUTES))
+    
+    # Queue the email in the same transaction, so it survives a restart
+    enqueue_password_reset_email(
+        db,
+        user.email,
+        reset_token,
+        f"{user.first_name} {user.last_name}".strip() or "User"
+    )
     
     try:
-        db.commit()
-        logger.info(f"Reset token stored in database for user {user.id}")
+        await db.commit()
+        logger.info("Reset code stored and email queued for user %s", user.id)
     except Exception as e:
-        db.rollback()
-        logger.error(f"Database error storing reset token: {e}")
+        await db.rollback()
+        logger.error("Database error storing reset token: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
     
-    # Send email in background
-    background_tasks.add_task(
-        email_service.send_password_reset_email,
-        user.email,
-        reset_token,
-        f"{user.first_name} {user.last_name}".strip() or "User"
-    )
+    # Let the dispatcher pick it up right away
+    outbox_dispatcher.wake()
+    RESET_CODE_REQUESTS.labels("issued").inc()
     
-    return {
-        "message": "Password reset code sent to your email",
-        "status": "success",
-        "expires_in": "15 minutes",
-        "email_sent_to": user.email,
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    return _code_sent(user.email, expires_at)
 
 @router.post("/verify-token")
 async def verify_reset_code(
     request: VerifyResetTokenRequest,
-    db: Session = Depends(get_db)
+    http_request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Step 2: Verify reset token
     """
-    logger.info(f"Token verification requested for email: {request.email}")
+    # Throttle code guessing before any SQL or hashing
+    await rate_limiter.check("verify", ip=client_ip(http_request), email=request.email)
     
     # Find user
-    user = db.query(User).filter(User.email == request.email.lower().strip()).first()
+    user = await get_user_by_email(db, request.email)
     
     if not user:
-        logger.error(f"Token verification failed: User not found for email {request.email}")
+        logger.warning("Token verification failed: unknown email")
         raise HTTPException(status_code=400, detail="Invalid email address")
     
-    if not user.reset_token:
-        logger.error(f"Token verification failed: No reset token for user {user.id}")
-        raise HTTPException(status_code=400, detail="No reset token found. Please request a new one.")
-    
-    # Check if token expired
-    if not user.reset_token_expiry:
-        logger.error(f"Token verification failed: No expiry time for user {user.id}")
-        raise HTTPException(status_code=400, detail="Reset token has no expiry time")
-    
-    if user.reset_token_expiry < datetime.utcnow():
-        logger.warning(f"Token expired for user {user.id}")
-        # Clear expired token
-        user.reset_token = None
-        user.reset_token_expiry = None
-        db.commit()
-        raise HTTPException(status_code=400, detail="Reset code has expired. Please request a new one.")
-    
-    # Verify token
-    if not verify_password(request.token, user.reset_token):
-        logger.warning(f"Invalid token for user {user.id}. Provided: {request.token}")
+    # Check and consume the code in the reset code store
+    outcome = await reset_code_store.verify(db, user.id, request.token)
+    
+    if outcome != CODE_OK:
+        # Persist the attempt counter / cleanup before failing
+        await db.commit()
+        if outcome == CODE_MISSING:
+            logger.warning("Token verification failed: no reset code for user %s", user.id)
+            raise HTTPException(status_code=400, detail="No reset token found. Please request a new one.")
+        if outcome == CODE_EXPIRED:
+            logger.warning("Reset code expired for user %s", user.id)
+            raise HTTPException(status_code=400, detail="Reset code has expired. Please request a new one.")
+        if outcome == CODE_LOCKED:
+            logger.warning("Too many invalid codes for user %s", user.id)
+            raise HTTPException(status_code=400, detail="Too many invalid attempts. Please request a new code.")
+        logger.warning("Invalid reset code for user %s", user.id)
         raise HTTPException(status_code=400, detail="Invalid reset code")
     
-    logger.info(f"Token verified successfully for user {user.id}")
-    
     # Generate JWT token for password reset
     jwt_token = generate_jwt_reset_token(user.id, user.email)
     
-    # Clear the one-time code after successful verification
-    user.reset_token = None
-    user.reset_token_expiry = None
-    
     try:
-        db.commit()
-        logger.info(f"Database updated after successful token verification for user {user.id}")
+        await db.commit()
+        logger.info("Reset code verified for user %s", user.id)
     except Exception as e:
-        db.rollback()
-        logger.error(f"Database error clearing token: {e}")
+        await db.rollback()
+        logger.error("Database error clearing reset code: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
     
     return {
@@ -149,57 +181,62 @@ async def verify_reset_code(
 @router.post("/reset")
 async def reset_password(
     request: ResetPasswordRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     Step 3: Reset password with JWT token
-    """
-    logger.info(f"Password reset requested for email: {request.email}")
     
+    Retries carrying the same Idempotency-Key replay the first response.
+    """
+    return await idempotent("password_reset", idempotency_key, request, lambda: _reset_password(request, db))
+
+async def _reset_password(request: ResetPasswordRequest, db: AsyncSession) -> dict:
     # Validate passwords match
     if request.new_password != request.confirm_password:
-        logger.error("Password reset failed: Passwords do not match")
+        logger.warning("Password reset failed: passwords do not match")
         raise HTTPException(status_code=400, detail="Passwords do not match")
     
     # Verify JWT token
     payload = verify_reset_token(request.token)
     if not payload:
-        logger.error("Password reset failed: Invalid JWT token")
+        logger.warning("Password reset failed: invalid reset token")
         raise HTTPException(status_code=400, detail="Invalid or expired reset token")
     
     user_id = int(payload.get("sub"))
     email = payload.get("email")
     
     # Verify email matches
-    if email.lower().strip() != request.email.lower().strip():
-        logger.error(f"Email mismatch: Token email {email} != Request email {request.email}")
+    if normalize_email(email) != normalize_email(request.email):
+        logger.warning("Password reset failed: email does not match the reset token (user %s)", user_id)
         raise HTTPException(status_code=400, detail="Email does not match reset token")
     
     # Find user
-    user = db.query(User).filter(
-        User.id == user_id,
-        User.email == email.lower().strip()
-    ).first()
+    result = await db.execute(select(User).where(User.id == user_id, by_email(email)))
+    user = result.scalars().first()
     
     if not user:
-        logger.error(f"Password reset failed: User not found - ID: {user_id}, Email: {email}")
+        logger.warning("Password reset failed: user %s not found", user_id)
         raise HTTPException(status_code=404, detail="User not found")
     
-    logger.info(f"Updating password for user {user.id}")
-    
     # Update password
-    user.password_hash = hash_password(request.new_password)
+    user.password_hash = await hash_password_async(request.new_password)
     
     # Clear any reset tokens
     user.reset_token = None
     user.reset_token_expiry = None
+    await reset_code_store.clear(db, user.id)
+    # Sign out every device: refresh tokens and the access tokens issued from them
+    revoked_sessions = await refresh_tokens.revoke_user_sessions(db, user.id)
     
     try:
-        db.commit()
-        logger.info(f"Password updated successfully for user {user.id}")
+        await db.commit()
+        refresh_tokens.publish(revoked_sessions)
+        user_cache.invalidate(user.id)
+        logger.info("Password updated for user %s", user.id)
     except Exception as e:
-        db.rollback()
-        logger.error(f"Database error updating password: {e}")
+        await db.rollback()
+        logger.error("Database error updating password: %s", e)
         raise HTTPException(status_code=500, detail="Database error")
     
     return {
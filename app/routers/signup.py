@@ -1,85 +1,112 @@
 # app/routers/signup.py - FIXED FOR PASSWORD RESET
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from typing import Optional
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Header
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from datetime import datetime
 from ..schemas import SignupRequest, SignupInfoUpdate
-from ..auth import hash_password
-from ..models import User
-from ..db import get_db
+from ..auth import hash_password_async, get_current_user_id, user_cache
+from ..db import get_async_db
+from ..idempotency import idempotent
+from .. import repository
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/signup", tags=["signup"])
 
+# INSERTs per signup when concurrent signups keep taking the allocated username
+USERNAME_ATTEMPTS = 3
+
 @router.post("")
-def signup(payload: SignupRequest, db: Session = Depends(get_db)):
+async def signup(
+    payload: SignupRequest,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None)
+):
+    # A retried request with the same Idempotency-Key gets the first response back
+    # (no second Argon2 run, no duplicate-email error)
+    return await idempotent("signup", idempotency_key, payload, lambda: _create_user(payload, db))
+
+async def _create_user(payload: SignupRequest, db: AsyncSession) -> dict:
     if payload.password != payload.confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match")
 
-    # Create username from FirstName + LastName
+    # Create username from FirstName + LastName (johnsmith2, ... if it's taken)
     username = f"{payload.first_name}{payload.last_name}".strip().lower()
 
-    # Create new user with password reset fields
-    new_user = User(
-        first_name=payload.first_name.strip(),
-        last_name=payload.last_name.strip(),
-        email=payload.email.lower().strip(),
-        username=username,
-        password_hash=hash_password(payload.password),
-        # Password reset fields (initialize to None)
-        reset_token=None,
-        reset_token_expiry=None,
-        is_active=True,
-        created_at=datetime.utcnow(),
-        # Other fields (can be updated later)
-        age=None,
-        weight=None,
-        foot_size=None,
-        purpose=None
-    )
+    # A taken email is one index probe, not an Argon2 run
+    if await repository.email_exists(db, payload.email):
+        raise HTTPException(status_code=400, detail="Email already exists")
+    # Don't hold a pooled connection while hashing
+    await db.rollback()
+
+    # Hashed once; a retried INSERT below reuses it
+    password_hash = await hash_password_async(payload.password)
     
+    # Create new user: one INSERT ... SELECT ... RETURNING that also picks the username
     try:
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-    except IntegrityError as e:
-        db.rollback()
-        if "email" in str(e).lower():
-            raise HTTPException(status_code=400, detail="Email already exists")
-        elif "username" in str(e).lower():
-            raise HTTPException(status_code=400, detail="Username already exists")
+        for _ in range(USERNAME_ATTEMPTS):
+            new_user = await repository.create_user(
+                db,
+                first_name=payload.first_name.strip(),
+                last_name=payload.last_name.strip(),
+                email=payload.email,
+                username=username,
+                password_hash=password_hash
+            )
+            if new_user is not None:
+                break
+            # A concurrent signup got there first: with this email, or with the name we picked
+            if await repository.email_exists(db, payload.email):
+                await db.rollback()
+                raise HTTPException(status_code=400, detail="Email already exists")
         else:
-            raise HTTPException(status_code=500, detail="Database error")
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="Could not allocate a username, please retry")
+        await db.commit()
+    except HTTPException:
+        raise
+    except IntegrityError as e:
+        await db.rollback()
+        logger.error("Signup insert failed: %s", e)
+        raise HTTPException(status_code=500, detail="Database error")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
     return {
         "message": "Signup successful", 
         "user_id": new_user.id,
-        "username": username,
+        "username": new_user.username,
         "email": new_user.email
     }
 
 @router.put("/info")
-def update_info(payload: SignupInfoUpdate, db: Session = Depends(get_db)):
-    # Find user
-    user = db.query(User).filter(User.id == payload.user_id).first()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Update user info
-    user.age = payload.age
-    user.weight = payload.weight
-    user.foot_size = payload.foot_size
-    user.purpose = payload.purpose
-    user.updated_at = datetime.utcnow()
+async def update_info(
+    payload: SignupInfoUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    # Always the token's user: signup returns no token, so clients log in first
+    if payload.user_id is not None and payload.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Cannot update another user's info")
     
+    # Update user info in one UPDATE ... RETURNING (no lookup, no refresh)
     try:
-        db.commit()
-        db.refresh(user)
+        found = await repository.update_info(
+            db,
+            user_id,
+            age=payload.age,
+            weight=payload.weight,
+            foot_size=payload.foot_size,
+            purpose=payload.purpose
+        )
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if not found:
+        raise HTTPException(status_code=404, detail="User not found")
+    user_cache.invalidate(user_id)
 
-    return {"message": "Info updated successfully"}
\ No newline at end of file
+    return {"message": "Info updated successfully"}
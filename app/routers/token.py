@@ -0,0 +1,55 @@
+# app/routers/token.py - refresh-token rotation, logout and introspection
+import logging
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..schemas import IntrospectRequest, IntrospectResponse, LoginResponse, RefreshTokenRequest
+from ..auth import create_token, introspect_tokens, require_api_key
+from ..config import INTROSPECTION_API_KEYS
+from ..db import get_async_db
+from .. import refresh_tokens
+from ..refresh_tokens import RefreshTokenReused
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/token", tags=["token"])
+
+@router.post("/refresh", response_model=LoginResponse)
+async def refresh(payload: RefreshTokenRequest, db: AsyncSession = Depends(get_async_db)):
+    """New access + refresh token pair for a refresh token (no password, no Argon2)"""
+    try:
+        rotated = await refresh_tokens.rotate(db, payload.refresh_token)
+    except RefreshTokenReused as e:
+        # A stolen or replayed token: the revocation must stick even though we refuse
+        await db.commit()
+        refresh_tokens.publish(e.family_ids)
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    if rotated is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    user_id, new_refresh_token, session_id = rotated
+    await db.commit()
+    
+    return LoginResponse(
+        token=create_token(user_id, session_id),
+        user_id=user_id,
+        refresh_token=new_refresh_token
+    )
+
+@router.post("/logout")
+async def logout(payload: RefreshTokenRequest, db: AsyncSession = Depends(get_async_db)):
+    """Revoke the session: its refresh token and every access token issued from it"""
+    revoked = await refresh_tokens.revoke_token_session(db, payload.refresh_token)
+    await db.commit()
+    refresh_tokens.publish(revoked)
+    return {"message": "Logged out", "status": "success"}
+
+@router.post("/introspect", response_model=IntrospectResponse,
+             dependencies=[Depends(require_api_key(INTROSPECTION_API_KEYS, "Token introspection"))])
+async def introspect(payload: IntrospectRequest):
+    """
+    Validity, subject, expiry and revocation for a batch of access tokens, in
+    request order. One call replaces N round trips for services that verify
+    tokens on someone else's behalf.
+    """
+    results = await introspect_tokens(payload.tokens, payload.use_cache)
+    return IntrospectResponse(results=results)
@@ -0,0 +1,10 @@
+# app/routers/users.py - endpoints for the signed-in user
+from fastapi import APIRouter, Depends
+from ..auth import get_current_user
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+@router.get("/me")
+async def read_me(user: dict = Depends(get_current_user)):
+    """Profile of the bearer token's user (token and row are cached, see app.auth)"""
+    return user
@@ -1,6 +1,8 @@
 ﻿# app/schemas.py
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional
+from typing import List, Optional
+from .config import INTROSPECTION_MAX_TOKENS
+from .utils.emails import normalize_email as _normalize_email
 
 # -------------------------------
 # Signup & Login Schemas
@@ -21,10 +23,11 @@ class SignupRequest(BaseModel):
 
     @validator("email")
     def normalize_email(cls, v):
-        return v.lower().strip()
+        return _normalize_email(v)
 
 class SignupInfoUpdate(BaseModel):
-    user_id: int
+    # The bearer token says whose info this is; a user_id, if sent, must match it
+    user_id: Optional[int] = None
     age: int = Field(..., ge=13, le=80)
     weight: float = Field(..., ge=30, le=150)
     foot_size: float = Field(..., ge=24.5, le=29.6)
@@ -34,9 +37,34 @@ class LoginRequest(BaseModel):
     email: EmailStr
     password: str = Field(..., min_length=6, max_length=100)
 
+    @validator("email")
+    def normalize_email(cls, v):
+        return _normalize_email(v)
+
 class LoginResponse(BaseModel):
     token: str
     user_id: int
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=20, max_length=200)
+
+class IntrospectRequest(BaseModel):
+    tokens: List[str] = Field(..., min_items=1, max_items=INTROSPECTION_MAX_TOKENS)
+    # False re-verifies every signature instead of trusting the token cache
+    use_cache: bool = True
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    exp: Optional[int] = None
+    iat: Optional[int] = None
+    sid: Optional[str] = None
+    revoked: bool = False
+    error: Optional[str] = None
+
+class IntrospectResponse(BaseModel):
+    results: List[TokenIntrospection]
 
 # -------------------------------
 # Forgot Password Flow Schemas
@@ -47,7 +75,7 @@ class ForgotPasswordRequest(BaseModel):
 
     @validator("email")
     def normalize_email(cls, v):
-        return v.lower().strip()
+        return _normalize_email(v)
 
 class VerifyResetTokenRequest(BaseModel):
     email: EmailStr
@@ -55,7 +83,7 @@ class VerifyResetTokenRequest(BaseModel):
 
     @validator("email")
     def normalize_email(cls, v):
-        return v.lower().strip()
+        return _normalize_email(v)
 
 class ResetPasswordRequest(BaseModel):
     email: EmailStr
@@ -71,4 +99,4 @@ class ResetPasswordRequest(BaseModel):
 
     @validator("email")
     def normalize_email(cls, v):
-        return v.lower().strip()
\ No newline at end of file
+        return _normalize_email(v)
\ No newline at end of file
@@ -0,0 +1,51 @@
+# app/singleflight.py - coalesce concurrent calls for the same key
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from .metrics import SINGLEFLIGHT_COALESCED
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Concurrent `do(key, fn)` calls share one execution of `fn`: the first
+    caller runs it and the rest wait for its result (or exception). Nothing is
+    cached once the call finishes. Per process, on the event loop; no locks needed.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        while key in self._calls:
+            future = self._calls[key]
+            SINGLEFLIGHT_COALESCED.labels(self.name).inc()
+            try:
+                # shield: a waiter that disconnects must not cancel everyone else's result
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled; the next caller through takes over
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here, so no "never retrieved" warning without waiters
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,9 @@
+# app/utils/emails.py
+
+
+def normalize_email(email: str) -> str:
+    """
+    The one canonical form of an address: what users.email stores and what
+    lookups compare against lower(email) (see repository.by_email)
+    """
+    return email.strip().lower()
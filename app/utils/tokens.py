@@ -3,7 +3,8 @@ import secrets
 import string
 from datetime import datetime, timedelta, timezone
 import jwt
-from ..config import SECRET_KEY, JWT_ALGORITHM
+from ..keys import get_key_ring
+from ..metrics import JWT_ENCODE_DURATION
 
 def generate_reset_token() -> str:
     """6-digit numeric token for mobile apps"""
@@ -19,12 +20,13 @@ def generate_jwt_reset_token(user_id: int, email: str, expires_minutes: int = 15
         "exp": now + timedelta(minutes=expires_minutes),
         "iat": now,
     }
-    return jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
+    with JWT_ENCODE_DURATION.labels("password_reset").time():
+        return get_key_ring().sign(payload)
 
 def verify_reset_token(token: str):
     """Verify and decode JWT reset token"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        payload = get_key_ring().decode(token)
         if payload.get("type") != "password_reset":
             return None
         return payload
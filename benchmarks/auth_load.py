@@ -0,0 +1,315 @@
+# benchmarks/auth_load.py - end-to-end load and latency benchmark for the auth API
+"""
+Runs main:app in-process (httpx ASGI transport, no network) against a local
+database and the fake email transport, drives concurrent workloads and
+reports req/s and p50/p95/p99 latency per endpoint.
+
+Workloads:
+  signup          POST /api/signup with unique users
+  login           POST /api/login against pre-created users
+  profile         PUT /api/signup/info against pre-created users
+  password_reset  forgot -> verify-token -> reset, per user
+
+Alongside latency, each endpoint reports the SQL statements (database round
+trips, not counting BEGIN/COMMIT) it executed per request, and the log
+records it emitted with the time the request spent handing them to the log
+queue (formatting and output happen on the listener thread).
+
+Usage:
+    python -m benchmarks.auth_load --concurrency 20 --requests 200
+    python -m benchmarks.auth_load --database-url postgresql://localhost/bench \\
+        --output benchmarks/results/pg.json --compare benchmarks/results/base.json
+
+By default a throwaway SQLite file is used. Results are written as JSON
+(with the git commit) so runs can be compared between commits.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+BENCH_PASSWORD = "benchpass1"
+BENCH_RESET_CODE = "424242"
+
+# Per-request [statements, log records, log seconds]; the in-process ASGI app
+# runs in the caller's context
+_counters = contextvars.ContextVar("bench_counters", default=None)
+
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    counters = _counters.get()
+    if counters is not None:
+        counters[0] += 1
+
+
+def track_logging():
+    """Charge each record's hand-off cost (filters, sampling, enqueue) to the current request"""
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # the client's own request lines
+    for handler in logging.getLogger().handlers:
+        handle = handler.handle
+
+        def timed_handle(record, handle=handle):
+            started = time.perf_counter()
+            try:
+                return handle(record)
+            finally:
+                counters = _counters.get()
+                if counters is not None:
+                    counters[1] += 1
+                    counters[2] += time.perf_counter() - started
+
+        handler.handle = timed_handle
+
+
+def configure_environment(args):
+    """Must run before the app is imported: app.config reads env at import"""
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix="auth-bench-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["EMAIL_TRANSPORT"] = "fake"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"  # every request comes from one client
+    if args.hash_workers is not None:
+        os.environ["ARGON2_POOL_SIZE"] = str(args.hash_workers)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.statements = defaultdict(list)
+        self.log_records = defaultdict(list)
+        self.log_seconds = defaultdict(list)
+
+    async def call(self, client, method: str, name: str, url: str, **kwargs):
+        counters = [0, 0, 0.0]
+        token = _counters.set(counters)
+        try:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            self.latencies[name].append((time.perf_counter() - started) * 1000)
+        finally:
+            _counters.reset(token)
+        self.statuses[name][response.status_code] += 1
+        self.statements[name].append(counters[0])
+        self.log_records[name].append(counters[1])
+        self.log_seconds[name].append(counters[2])
+        return response
+
+    def summary(self, elapsed: dict) -> dict:
+        report = {}
+        for name, values in self.latencies.items():
+            values = sorted(values)
+            report[name] = {
+                "requests": len(values),
+                "req_per_sec": round(len(values) / elapsed[name], 1) if elapsed.get(name) else None,
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "mean_ms": round(statistics.fmean(values), 2),
+                "sql_per_req": round(statistics.fmean(self.statements[name]), 2),
+                "logs_per_req": round(statistics.fmean(self.log_records[name]), 2),
+                "log_us_per_req": round(statistics.fmean(self.log_seconds[name]) * 1e6, 1),
+                "statuses": dict(self.statuses[name]),
+            }
+        return report
+
+
+def new_user(prefix: str) -> dict:
+    tag = uuid.uuid4().hex[:10]
+    return {
+        "first_name": f"{prefix}{tag}",
+        "last_name": "Bench",
+        "email": f"{prefix}-{tag}@example.com",
+        "password": BENCH_PASSWORD,
+        "confirm_password": BENCH_PASSWORD,
+    }
+
+
+async def run_pool(concurrency: int, jobs):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def guarded(job):
+        async with semaphore:
+            await job()
+
+    await asyncio.gather(*(guarded(job) for job in jobs))
+
+
+async def workload_signup(client, recorder, args):
+    async def job():
+        await recorder.call(client, "POST", "signup", "/api/signup", json=new_user("s"))
+    await run_pool(args.concurrency, [job] * args.requests)
+
+
+async def _create_users(client, count: int, prefix: str):
+    users = []
+    for _ in range(count):
+        user = new_user(prefix)
+        response = await client.post("/api/signup", json=user)
+        response.raise_for_status()
+        users.append(user)
+    return users
+
+
+async def workload_login(client, recorder, args):
+    users = await _create_users(client, min(args.requests, args.users), "l")
+
+    def job_for(user):
+        async def job():
+            await recorder.call(client, "POST", "login", "/api/login",
+                                json={"email": user["email"], "password": BENCH_PASSWORD})
+        return job
+    await run_pool(args.concurrency, [job_for(users[i % len(users)]) for i in range(args.requests)])
+
+
+async def workload_profile(client, recorder, args):
+    users = await _create_users(client, min(args.requests, args.users), "p")
+    tokens = []
+    for user in users:
+        response = await client.post("/api/login", json={"email": user["email"], "password": BENCH_PASSWORD})
+        tokens.append(response.json()["token"])
+
+    def job_for(token):
+        async def job():
+            await recorder.call(client, "PUT", "profile", "/api/signup/info",
+                                headers={"Authorization": f"Bearer {token}"},
+                                json={"age": 30, "weight": 70.5, "foot_size": 26.5, "purpose": "benchmark"})
+        return job
+    await run_pool(args.concurrency, [job_for(tokens[i % len(tokens)]) for i in range(args.requests)])
+
+
+async def workload_password_reset(client, recorder, args):
+    users = await _create_users(client, args.requests, "r")
+
+    def job_for(user):
+        async def job():
+            await recorder.call(client, "POST", "password_forgot", "/api/password/forgot",
+                                json={"email": user["email"]})
+            response = await recorder.call(client, "POST", "password_verify", "/api/password/verify-token",
+                                           json={"email": user["email"], "token": BENCH_RESET_CODE})
+            reset_token = response.json().get("reset_token") if response.status_code == 200 else "invalid"
+            await recorder.call(client, "POST", "password_reset", "/api/password/reset",
+                                json={"email": user["email"], "token": reset_token,
+                                      "new_password": "benchpass2", "confirm_password": "benchpass2"})
+        return job
+    await run_pool(args.concurrency, [job_for(user) for user in users])
+
+
+WORKLOADS = {
+    "signup": (workload_signup, ["signup"]),
+    "login": (workload_login, ["login"]),
+    "profile": (workload_profile, ["profile"]),
+    "password_reset": (workload_password_reset, ["password_forgot", "password_verify", "password_reset"]),
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"{'endpoint':<18}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL/req':>9}"
+          f"{'logs/req':>10}{'log us/req':>12}  statuses")
+    for name, row in report.items():
+        line = (f"{name:<18}{row['req_per_sec'] or 0:>9}{row['p50_ms']:>10}"
+                f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row.get('sql_per_req', 0):>9}"
+                f"{row.get('logs_per_req', 0):>10}{row.get('log_us_per_req', 0):>12}  {row['statuses']}")
+        old = (baseline or {}).get(name)
+        if old and old.get("p95_ms"):
+            change = (row["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+            line += f"  (p95 {change:+.1f}% vs baseline"
+            if old.get("sql_per_req") is not None:
+                line += f", SQL/req {old['sql_per_req']} -> {row['sql_per_req']}"
+            line += ")"
+        print(line)
+
+
+async def main(args):
+    configure_environment(args)
+
+    import httpx
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    import main as app_main
+    from app.db import engine, Base
+    from app.routers import password_reset
+    from app import models  # noqa: F401  (register tables)
+
+    Base.metadata.create_all(bind=engine)
+    event.listen(Engine, "before_cursor_execute", count_statement)
+    track_logging()
+    # Deterministic reset code so the benchmark can complete the flow
+    password_reset.generate_reset_token = lambda: BENCH_RESET_CODE
+
+    recorder = Recorder()
+    elapsed = {}
+    # The lifespan hook disposes the engines on the way out
+    async with app_main.app.router.lifespan_context(app_main.app):
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name in args.workloads.split(","):
+                workload, endpoints = WORKLOADS[name.strip()]
+                print(f"▶ {name}: {args.requests} requests, concurrency {args.concurrency}")
+                started = time.perf_counter()
+                await workload(client, recorder, args)
+                for endpoint in endpoints:
+                    elapsed[endpoint] = time.perf_counter() - started
+
+    report = recorder.summary(elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get("endpoints")
+    print_report(report, baseline)
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "database": os.environ["DATABASE_URL"].split("@")[-1],
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "endpoints": report,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"💾 Results saved to {args.output}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", default="signup,login,profile,password_reset")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="requests (or flows) per workload")
+    parser.add_argument("--users", type=int, default=50, help="distinct accounts for the login workload")
+    parser.add_argument("--hash-workers", type=int, help="override ARGON2_POOL_SIZE")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--output", default="benchmarks/results/latest.json")
+    parser.add_argument("--compare", help="previous results JSON to diff p95 against")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
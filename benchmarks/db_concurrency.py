@@ -0,0 +1,111 @@
+# benchmarks/db_concurrency.py - sync vs async database access under concurrency
+"""
+Compare the three ways a request can talk to the database:
+
+  sync-on-loop  sync Session called inside the event loop (old reset handlers)
+  threadpool    sync Session in worker threads (old signup/login)
+  async         AsyncSession on the asyncpg engine (current routers)
+
+For each mode it reports queries/s and the worst event-loop stall seen by a
+ticker coroutine, which is what /health and every other endpoint feel.
+
+Usage:
+    python -m benchmarks.db_concurrency --concurrency 50 --queries 500
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+from app.db import SessionLocal, AsyncSessionLocal, engine, async_engine
+
+
+def _sync_query(sql: str):
+    db = SessionLocal()
+    try:
+        db.execute(text(sql)).all()
+    finally:
+        db.close()
+
+
+async def _async_query(sql: str):
+    async with AsyncSessionLocal() as db:
+        (await db.execute(text(sql))).all()
+
+
+async def _loop_ticker(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Return the worst lag between expected and actual ticks"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run_mode(mode: str, sql: str, concurrency: int, queries: int) -> dict:
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_loop_ticker(stop))
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def one():
+        async with semaphore:
+            if mode == "sync-on-loop":
+                _sync_query(sql)
+            elif mode == "threadpool":
+                await loop.run_in_executor(executor, _sync_query, sql)
+            else:
+                await _async_query(sql)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(queries)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    worst_lag = await ticker
+    executor.shutdown()
+    return {
+        "mode": mode,
+        "queries": queries,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "queries_per_sec": round(queries / elapsed, 1),
+        "max_loop_lag_ms": round(worst_lag * 1000, 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--sql", default="SELECT 1", help="statement to run per query")
+    parser.add_argument("--modes", default="sync-on-loop,threadpool,async")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    # Warm both pools so connection setup isn't measured
+    _sync_query(args.sql)
+    await _async_query(args.sql)
+
+    results = []
+    for mode in args.modes.split(","):
+        result = await run_mode(mode.strip(), args.sql, args.concurrency, args.queries)
+        results.append(result)
+        print(f"{result['mode']:>13}: {result['queries_per_sec']:>8} q/s, "
+              f"max loop lag {result['max_loop_lag_ms']} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    engine.dispose()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+# benchmarks/resend_stub.py - local stand-in for the Resend REST API
+"""
+Accepts the two endpoints the app uses (POST /emails, POST /emails/batch),
+records what it receives and answers like Resend does. Point the app at it
+with:
+
+    RESEND_API_URL=http://127.0.0.1:8025 RESEND_API_KEY=test EMAIL_TRANSPORT=http
+
+Run:
+    uvicorn benchmarks.resend_stub:app --port 8025
+
+Knobs (env): STUB_LATENCY_MS adds a delay per call, STUB_FAIL_RATE (0-1)
+answers a share of calls with 503 so the retry and circuit-breaker paths
+can be exercised. GET /_stub/stats returns counters, /_stub/sent the mail.
+"""
+import asyncio
+import itertools
+import os
+import random
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+FAIL_RATE = float(os.getenv("STUB_FAIL_RATE", "0"))
+
+_ids = itertools.count(1)
+sent = []
+stats = {"requests": 0, "emails": 0, "failures": 0, "unauthorized": 0}
+
+
+async def _accept(request: Request):
+    stats["requests"] += 1
+    if not request.headers.get("authorization", "").startswith("Bearer "):
+        stats["unauthorized"] += 1
+        return JSONResponse({"name": "missing_api_key"}, status_code=401)
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    if FAIL_RATE and random.random() < FAIL_RATE:
+        stats["failures"] += 1
+        return JSONResponse({"name": "internal_server_error"}, status_code=503)
+    return None
+
+
+def _record(message: dict) -> dict:
+    email_id = f"stub-{next(_ids)}"
+    sent.append({"id": email_id, **message})
+    stats["emails"] += 1
+    return {"id": email_id}
+
+
+async def send_email(request: Request):
+    rejected = await _accept(request)
+    if rejected:
+        return rejected
+    return JSONResponse(_record(await request.json()))
+
+
+async def send_batch(request: Request):
+    rejected = await _accept(request)
+    if rejected:
+        return rejected
+    messages = await request.json()
+    if len(messages) > 100:
+        return JSONResponse({"name": "validation_error"}, status_code=422)
+    return JSONResponse({"data": [_record(m) for m in messages]})
+
+
+async def get_stats(request: Request):
+    return JSONResponse(stats)
+
+
+async def get_sent(request: Request):
+    return JSONResponse(sent)
+
+
+app = Starlette(routes=[
+    Route("/emails", send_email, methods=["POST"]),
+    Route("/emails/batch", send_batch, methods=["POST"]),
+    Route("/_stub/stats", get_stats),
+    Route("/_stub/sent", get_sent),
+])
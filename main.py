@@ -2,29 +2,99 @@
 import os
 import sys
 import asyncio
+import math
+import logging
+from contextlib import asynccontextmanager
 
 # Add current directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
-print(f"📁 Current directory: {current_dir}")
-print(f"🐍 Python path: {sys.path}")
-
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from datetime import datetime
+from app.admission import AdmissionMiddleware, admission_controller
+from app.auth import HashPoolBusy, get_hash_pool_metrics, shutdown_hash_pool
+from app.config import STARTUP_MODE, DOCS_ENABLED, JWKS_MAX_AGE
+from app.db import PoolExhausted
+from app.keys import get_key_ring
+from app.rate_limit import RateLimited
+from app import metrics
+from app.logging_setup import setup_logging
+
+# Before anything logs: JSON lines through a background thread
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+# ✅ STARTUP / SHUTDOWN
+# In the default "fast" mode nothing expensive happens here: the DB engine,
+# the email client and the OpenAPI schema are built on first use.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from app.db import dispose_engines, get_replica_set
+    from app.email_outbox import outbox_dispatcher
+    from app.email_service import email_service
+    from app.reset_codes import reset_code_sweeper
+    from app.revocation import revocation_filter
+
+    if STARTUP_MODE == "eager":
+        await warm_up(app)
+    outbox_dispatcher.start()
+    reset_code_sweeper.start()
+    revocation_filter.start()
+    replicas = get_replica_set()
+    if replicas:
+        replicas.start()
+    try:
+        yield
+    finally:
+        if replicas:
+            await replicas.stop()
+        await reset_code_sweeper.stop()
+        await revocation_filter.stop()
+        await outbox_dispatcher.stop()
+        await email_service.http.aclose()
+        shutdown_hash_pool(wait=False)
+        await dispose_engines()
+
+
+async def warm_up(app: FastAPI):
+    """Build what fast mode defers, so the first request doesn't pay for it"""
+    from sqlalchemy import text
+    from app.db import AsyncSessionLocal
+    from app.email_service import email_service
+
+    get_key_ring()
+    if email_service.transport == "http":
+        email_service.http.client
+    else:
+        email_service.resend
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.error("❌ Database warm-up failed: %s", e)
+    if app.openapi_url:
+        app.openapi()
+
 
 # Create app first
 app = FastAPI(
     title="Sure Step Auth API",
     description="Authentication System for Sure Step App",
     version="1.0.0",
-    docs_url="/docs",
-    redoc_url="/redoc"
+    docs_url="/docs" if DOCS_ENABLED else None,
+    redoc_url="/redoc" if DOCS_ENABLED else None,
+    openapi_url="/openapi.json" if DOCS_ENABLED else None,
+    lifespan=lifespan
 )
 
+# Load shedding for the hashing routes (added first so it sits inside CORS)
+app.add_middleware(AdmissionMiddleware)
+
 # CORS for mobile app
 app.add_middleware(
     CORSMiddleware,
@@ -34,21 +104,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency per route/status + SQLAlchemy and pool hooks
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.install()
+
 # Try to import routers with better error handling
 try:
     try:
-        from app.routers import signup, login, password_reset
+        from app.routers import signup, login, password_reset, users, token, admin
     except ImportError:
-        from app.routers import signup, login, password_reset
+        from app.routers import signup, login, password_reset, users, token, admin
     
     app.include_router(signup.router, prefix="/api")
     app.include_router(login.router, prefix="/api")
     app.include_router(password_reset.router, prefix="/api")
+    app.include_router(users.router, prefix="/api")
+    app.include_router(token.router, prefix="/api")
+    app.include_router(admin.router, prefix="/api")
     
-    print("✅ All routers imported successfully")
+    logger.info("✅ All routers imported successfully")
 
 except ImportError as e:
-    print(f"❌ Router import error: {e}")
+    logger.error("❌ Router import error: %s", e)
     from fastapi import APIRouter
     
     test_router = APIRouter()
@@ -66,7 +143,7 @@ except ImportError as e:
         return {"message": "Test login - routers not loaded", "status": "test"}
     
     app.include_router(test_router, prefix="/api")
-    print("⚠️ Using test router mode")
+    logger.warning("⚠️ Using test router mode")
 
 # ✅ ROOT ENDPOINT
 @app.get("/")
@@ -82,7 +159,14 @@ async def root():
             "forgot_password": "POST /api/password/forgot",
             "verify_reset": "POST /api/password/verify-token",
             "reset_password": "POST /api/password/reset",
+            "current_user": "GET /api/users/me",
+            "refresh_token": "POST /api/token/refresh",
+            "logout": "POST /api/token/logout",
+            "introspect_tokens": "POST /api/token/introspect",
+            "import_users": "POST /api/admin/users/import",
             "health_check": "GET /health",
+            "metrics": "GET /metrics",
+            "jwks": "GET /.well-known/jwks.json",
             "email_test": "GET /test-email-config",
             "docs": "GET /docs",
             "redoc": "GET /redoc"
@@ -96,8 +180,28 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
         "service": "Sure Step Auth API",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "hash_pool": get_hash_pool_metrics(),
+        "admission": admission_controller.stats()
+    }
+
+# ✅ PROMETHEUS METRICS
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
+
+# ✅ PUBLIC SIGNING KEYS (verify tokens locally without calling this API)
+@app.get("/.well-known/jwks.json", include_in_schema=False)
+async def jwks(request: Request):
+    body, etag = get_key_ring().jwks()
+    headers = {
+        "Cache-Control": f"public, max-age={JWKS_MAX_AGE}",
+        "ETag": etag
     }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/jwk-set+json", headers=headers)
 
 # ✅ ✅ UPDATED RESEND TEST ENDPOINT
 @app.get("/test-email-config")
@@ -131,7 +235,7 @@ async def test_email_config():
             results.append(f"✅ Render Compatible: {config['render_compatible']}")
             
             # Test email sending
-            test_result = email_service.send_password_reset_email(
+            test_result = await email_service.send_password_reset_email_async(
                 to_email="delivered@resend.dev",
                 reset_token="TEST123",
                 user_name="Test User"
@@ -158,6 +262,42 @@ async def test_email_config():
         }
     }
 
+# ✅ HASH POOL BACKPRESSURE
+@app.exception_handler(HashPoolBusy)
+async def hash_pool_busy_handler(request: Request, exc: HashPoolBusy):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "1"},
+        content={
+            "message": "Server is busy, please retry shortly",
+            "path": request.url.path
+        }
+    )
+
+# ✅ DATABASE POOL BACKPRESSURE
+@app.exception_handler(PoolExhausted)
+async def pool_exhausted_handler(request: Request, exc: PoolExhausted):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "1"},
+        content={
+            "message": "Server is busy, please retry shortly",
+            "path": request.url.path
+        }
+    )
+
+# ✅ RATE LIMITING
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+        content={
+            "message": "Too many attempts, please try again later",
+            "path": request.url.path
+        }
+    )
+
 # ✅ GLOBAL ERROR HANDLER
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -174,11 +314,7 @@ async def global_exception_handler(request: Request, exc: Exception):
 if __name__ == "__main__":
     import uvicorn
     
-    print("\n" + "=" * 50)
-    print("🚀 Starting Sure Step Auth API")
-    print("🌐 Local: http://localhost:8000")
-    print("📚 Docs: http://localhost:8000/docs")
-    print("=" * 50 + "\n")
+    logger.info("🚀 Starting Sure Step Auth API on http://localhost:8000 (docs at /docs)")
     
     uvicorn.run(
         "main:app",
@@ -1,77 +1,59 @@
-# migrate_database.py - UPDATED FOR SQLALCHEMY 1.4.50
-from sqlalchemy import text, inspect
+# migrate_database.py - apply pending schema migrations (see app/migrations.py)
+"""
+Usage:
+    python migrate_database.py                 # apply everything pending
+    python migrate_database.py --dry-run       # print the plan, change nothing
+    python migrate_database.py --target 1 --batch-size 500 --pause 0.2
+    python migrate_database.py --status        # list applied versions
+"""
+import argparse
+import sys
+
+from sqlalchemy import text
+
 from app.db import engine
-from app.models import Base
+from app.migrations import MIGRATIONS, Options, applied_versions, migrate
+
 
-print('=' * 60)
-print('DATABASE MIGRATION FOR PASSWORD RESET + ULCER HISTORY')
-print('=' * 60)
+def main():
+    defaults = Options()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="show pending steps without running them")
+    parser.add_argument("--status", action="store_true", help="show applied and pending versions")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size, help="rows per backfill batch")
+    parser.add_argument("--pause", type=float, default=defaults.pause, help="seconds between backfill batches")
+    parser.add_argument("--lock-timeout", default=defaults.lock_timeout, help="PostgreSQL lock_timeout for DDL")
+    args = parser.parse_args()
 
-try:
-    # First, let's check current columns
-    with engine.connect() as conn:
-        inspector = inspect(engine)
-        
-        # Check if users table exists
-        if not inspector.has_table('users'):
-            print("❌ Users table doesn't exist. Creating from scratch...")
-            Base.metadata.create_all(bind=engine)
-            print("✅ Users table created successfully!")
-        else:
-            # Check existing columns
-            columns = inspector.get_columns('users')
-            column_names = [c['name'] for c in columns]
-            print(f"Current columns in 'users' table: {column_names}")
-            
-            # Check for missing columns for password reset
-            required_columns = ['reset_token', 'reset_token_expiry', 'is_active', 'updated_at']
-            missing_columns = [col for col in required_columns if col not in column_names]
-            
-            if missing_columns:
-                print(f"Missing columns: {missing_columns}")
-                
-                # Add missing columns one by one
-                if 'reset_token' not in column_names:
-                    print("Adding 'reset_token' column...")
-                    conn.execute(text("ALTER TABLE users ADD COLUMN reset_token VARCHAR(255)"))
-                    conn.commit()
-                    print("✅ Added 'reset_token' column")
-                
-                if 'reset_token_expiry' not in column_names:
-                    print("Adding 'reset_token_expiry' column...")
-                    conn.execute(text("ALTER TABLE users ADD COLUMN reset_token_expiry TIMESTAMP"))
-                    conn.commit()
-                    print("✅ Added 'reset_token_expiry' column")
-                
-                if 'is_active' not in column_names:
-                    print("Adding 'is_active' column...")
-                    conn.execute(text("ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT true"))
-                    conn.commit()
-                    print("✅ Added 'is_active' column")
-                
-                if 'updated_at' not in column_names:
-                    print("Adding 'updated_at' column...")
-                    conn.execute(text("ALTER TABLE users ADD COLUMN updated_at TIMESTAMP WITH TIME ZONE"))
-                    conn.commit()
-                    print("✅ Added 'updated_at' column")
-                
-                print(f"\n✅ Migration completed! Added {len(missing_columns)} columns")
-            else:
-                print("✅ All required password reset columns already exist!")
-            
-            # ✅ Add ulcer_history column if missing
-            if 'ulcer_history' not in column_names:
-                print("Adding 'ulcer_history' column...")
-                conn.execute(text("ALTER TABLE users ADD COLUMN ulcer_history JSONB DEFAULT '[]'::JSONB"))
-                conn.commit()
-                print("✅ Added 'ulcer_history' column")
-            else:
-                print("✅ 'ulcer_history' column already exists!")
-    
     print('=' * 60)
-    print("✅ Database migration completed!")
-    
-except Exception as e:
-    print(f"❌ Migration failed: {e}")
-    import traceback
-    traceback.print_exc()
+    print('DATABASE MIGRATION')
+    print('=' * 60)
+
+    if args.status:
+        done = applied_versions(engine)
+        with engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT version, name, applied_at, duration_ms FROM schema_migrations ORDER BY version"
+            )).all()
+        for row in rows:
+            print(f"  {row.version:04d}  {row.applied_at}  {row.duration_ms:>7} ms  {row.name}")
+        for migration in MIGRATIONS:
+            if migration.version not in done:
+                print(f"  {migration.version:04d}  pending  {migration.name}")
+        return
+
+    options = Options(dry_run=args.dry_run, lock_timeout=args.lock_timeout,
+                      batch_size=args.batch_size, pause=args.pause)
+    try:
+        migrate(engine, options, target=args.target)
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        print("   Every step is idempotent: fix the cause and run this again.")
+        sys.exit(1)
+    print('=' * 60)
+    print("✅ Database migration completed!" if not args.dry_run else "Dry run: nothing was changed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# scripts/calibrate_argon2.py - pick Argon2 parameters for this host
+"""
+Benchmarks Argon2 verify on this machine and prints the strongest
+parameters whose median verify time stays under the target latency.
+
+Usage:
+    python -m scripts.calibrate_argon2 --target-ms 250 --max-memory-mib 64
+
+Copy the printed ARGON2_* lines into the service environment (Render
+dashboard or .env). Existing users are rehashed with the new parameters
+the next time they log in.
+"""
+import argparse
+import os
+import statistics
+import time
+
+from passlib.hash import argon2
+
+
+def measure(time_cost: int, memory_kib: int, parallelism: int, samples: int) -> float:
+    """Median verify time in milliseconds"""
+    handler = argon2.using(time_cost=time_cost, memory_cost=memory_kib, parallelism=parallelism)
+    hashed = handler.hash("calibration-password")
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.verify("calibration-password", hashed)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(target_ms: float, max_memory_mib: int, parallelism: int, max_time_cost: int, samples: int):
+    """
+    For each memory size (largest first) find the highest time_cost under the
+    target; keep the combination with the most total work (memory x passes).
+    """
+    memory_options = []
+    memory_mib = max_memory_mib
+    while memory_mib >= 1:
+        memory_options.append(memory_mib * 1024)
+        memory_mib //= 2
+
+    results = []
+    best = None
+    for memory_kib in memory_options:
+        for time_cost in range(1, max_time_cost + 1):
+            ms = measure(time_cost, memory_kib, parallelism, samples)
+            results.append((time_cost, memory_kib, ms))
+            print(f"  t={time_cost:<2} m={memory_kib // 1024:>4} MiB p={parallelism}: {ms:8.1f} ms")
+            if ms > target_ms:
+                break
+            if best is None or time_cost * memory_kib > best[0] * best[1]:
+                best = (time_cost, memory_kib, ms)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=250, help="max median verify latency")
+    parser.add_argument("--max-memory-mib", type=int, default=64, help="largest memory_cost to try")
+    parser.add_argument("--parallelism", type=int, default=min(os.cpu_count() or 1, 2))
+    parser.add_argument("--max-time-cost", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Calibrating Argon2 for a {args.target_ms:.0f} ms verify target on {os.cpu_count()} CPU(s)")
+    best, _ = calibrate(args.target_ms, args.max_memory_mib, args.parallelism, args.max_time_cost, args.samples)
+
+    print("=" * 60)
+    if best is None:
+        print("❌ No parameters meet the target; raise --target-ms or lower --max-memory-mib")
+        return
+
+    time_cost, memory_kib, ms = best
+    print(f"✅ Selected: time_cost={time_cost}, memory_cost={memory_kib} KiB, "
+          f"parallelism={args.parallelism} ({ms:.1f} ms)")
+    print(f"   Each worker verifies ~{1000 / ms:.1f} passwords/s")
+    print()
+    print(f"ARGON2_TIME_COST={time_cost}")
+    print(f"ARGON2_MEMORY_COST={memory_kib}")
+    print(f"ARGON2_PARALLELISM={args.parallelism}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# scripts/check_email_index.py - EXPLAIN the email lookups as the users table grows
+"""
+Grows users with synthetic rows in steps, runs ANALYZE, and EXPLAINs the
+statements login and forgot-password actually run (repository.by_email).
+Each must be a probe of uq_users_email_lower, never a sequential scan;
+the script exits 1 otherwise, so CI can run it after migrate_database.py.
+
+Everything happens in one transaction that is rolled back, but the inserts
+do take locks and space while it runs: point it at a scratch database.
+
+    python migrate_database.py
+    python -m scripts.check_email_index --sizes 1000,10000,100000
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from sqlalchemy import select, text
+
+from app import db
+from app.models import User
+from app.repository import _SELECT_CREDENTIALS, by_email
+from app.utils.emails import normalize_email
+
+INDEX = "uq_users_email_lower"
+# Mixed case on purpose: the lookup must normalise before it hits the index
+PROBE = "  Explain-7@Example.TEST "
+
+_GROW = text("""
+WITH RECURSIVE g(n) AS (SELECT CAST(:start AS INTEGER) UNION ALL SELECT n + 1 FROM g WHERE n < :stop)
+INSERT INTO users (first_name, last_name, email, username, password_hash, is_active)
+SELECT 'Explain', 'Check', 'explain-' || n || '@example.test', 'explain-check-' || n, 'x', true FROM g
+""")
+
+
+def lookups(dialect):
+    statements = {
+        "login": _SELECT_CREDENTIALS.params(email=normalize_email(PROBE)),
+        "forgot-password": select(User).where(by_email(PROBE)),
+    }
+    return {
+        name: str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        for name, statement in statements.items()
+    }
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+async def explain(session, sql: str):
+    """(uses the index without scanning users, one-line plan summary)"""
+    if session.get_bind().dialect.name == "postgresql":
+        plan = (await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+        plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+        nodes = list(_nodes(plan))
+        ok = (any(node.get("Index Name") == INDEX for node in nodes)
+              and not any(node["Node Type"] == "Seq Scan" for node in nodes))
+        summary = " -> ".join(
+            node["Node Type"] + (f" using {node['Index Name']}" if "Index Name" in node else "") for node in nodes
+        )
+        return ok, f"{summary} (cost {plan['Total Cost']})"
+
+    rows = (await session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))).all()
+    details = [row[-1] for row in rows]
+    ok = any(INDEX in detail for detail in details) and not any(detail.startswith("SCAN") for detail in details)
+    return ok, "; ".join(details)
+
+
+async def main(sizes):
+    failed = False
+    try:
+        async with db.AsyncSessionLocal() as session:
+            statements = lookups(session.get_bind().dialect)
+            existing = (await session.execute(text("SELECT count(*) FROM users"))).scalar()
+            inserted = 0
+            for size in sizes:
+                if size > inserted:
+                    await session.execute(_GROW, {"start": inserted + 1, "stop": size})
+                    inserted = size
+                await session.execute(text("ANALYZE users"))
+                print(f"📈 users: {existing + inserted} rows")
+                for name, sql in statements.items():
+                    ok, summary = await explain(session, sql)
+                    failed |= not ok
+                    print(f"  {'✅' if ok else '❌'} {name:<16} {summary}")
+            await session.rollback()
+    finally:
+        await db.dispose_engines()
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # A table of a page or two is scanned whatever its indexes, so start at 1000
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma-separated synthetic row counts to check at")
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(main([int(size) for size in args.sizes.split(",")])) else 0)
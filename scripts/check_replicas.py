@@ -0,0 +1,49 @@
+# scripts/check_replicas.py - verify read-replica routing against real databases
+"""
+Runs one health check over DATABASE_REPLICA_URLS, then issues routed reads
+and writes through the same session factory the routers use, printing
+which database served each statement.
+
+Two local databases are enough to try it (no replication needed):
+
+    createdb auth_replica
+    DATABASE_URL=postgresql://localhost/auth \\
+    DATABASE_REPLICA_URLS=postgresql://localhost/auth_replica \\
+    DATABASE_SSL=disable python -m scripts.check_replicas --reads 6
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import func, select, text
+
+from app import db
+
+
+async def main(reads: int):
+    replicas = db.get_replica_set()
+    if replicas is None:
+        print("❌ DATABASE_REPLICA_URLS is not set")
+        return
+    await replicas.check()
+    print(f"🩺 Healthy replicas: {replicas.healthy} of {len(replicas.engines)}")
+
+    try:
+        async with db.AsyncReadSessionLocal() as session:
+            for i in range(reads):
+                served_by = (await session.execute(select(func.current_database()))).scalar()
+                print(f"  read {i + 1}: {served_by}")
+
+            # Anything but a plain SELECT (writes, text(), FOR UPDATE) pins the
+            # rest of the session to the primary (read-your-writes)
+            await session.execute(text("SELECT 1"))
+            served_by = (await session.execute(select(func.current_database()))).scalar()
+            print(f"  read after write: {served_by}")
+            await session.rollback()
+    finally:
+        await db.dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=4)
+    asyncio.run(main(parser.parse_args().reads))
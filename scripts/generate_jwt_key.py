@@ -0,0 +1,49 @@
+# scripts/generate_jwt_key.py - create a signing key for the JWT key ring
+"""
+Prints (or writes) a new private key for JWT_ALGORITHM=EdDSA or ES256.
+
+Usage:
+    python -m scripts.generate_jwt_key --algorithm EdDSA --kid 2026-10 --out-dir /etc/secrets/jwt
+
+Rotation (JWT_KEY_ID is optional only while the ring holds a single key;
+with two or more the app refuses to start unless it names the signing key):
+  0. If JWT_KEY_ID isn't set yet, set it to the current key's kid.
+  1. Add the new <kid>.pem next to the current key in JWT_KEY_DIR and deploy.
+     Its public key is now in /.well-known/jwks.json, still unused.
+  2. After consumers have refreshed their JWKS cache (JWKS_MAX_AGE), set
+     JWT_KEY_ID=<kid> so new tokens are signed with it.
+  3. Once the longest-lived token signed with the old key has expired,
+     delete the old .pem.
+"""
+import argparse
+import os
+
+from app.keys import ASYMMETRIC_ALGORITHMS, generate_private_key, key_id, private_key_pem
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--algorithm", choices=ASYMMETRIC_ALGORITHMS, default="EdDSA")
+    parser.add_argument("--kid", help="key id (defaults to a hash of the public key)")
+    parser.add_argument("--out-dir", help="write <kid>.pem here instead of printing it")
+    args = parser.parse_args()
+
+    private_key = generate_private_key(args.algorithm)
+    kid = args.kid or key_id(private_key)
+    pem = private_key_pem(private_key)
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        path = os.path.join(args.out_dir, f"{kid}.pem")
+        with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+            f.write(pem)
+        print(f"✅ Wrote {path}")
+    else:
+        print(pem, end="")
+        print(f"# kid: {kid}")
+        one_line = pem.strip().replace("\n", "\\n")
+        print(f"# As a single-line env var: JWT_PRIVATE_KEY={one_line} JWT_KEY_ID={kid}")
+
+
+if __name__ == "__main__":
+    main()
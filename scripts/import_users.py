@@ -0,0 +1,80 @@
+# scripts/import_users.py - bulk-create accounts from a CSV or JSONL file
+"""
+Same pipeline as POST /api/admin/users/import (see app/bulk_import.py), run
+from a shell against DATABASE_URL.
+
+CSV needs a header row with first_name, last_name, email, password
+(confirm_password is optional); JSONL has one object per line with the same
+fields. Bad rows are reported and skipped; the rest are created.
+
+Usage:
+    python -m scripts.import_users clinic.csv --workers 8
+    python -m scripts.import_users - --format jsonl < clinic.jsonl
+    python -m scripts.import_users clinic.csv --errors-out rejected.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+
+async def file_lines(path: str):
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+    try:
+        for line in stream:
+            yield line.rstrip("\n")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+async def run(args) -> dict:
+    from app.auth import shutdown_hash_pool
+    from app.bulk_import import import_users
+    from app.config import IMPORT_CHUNK_SIZE
+    from app.db import dispose_engines
+
+    try:
+        return await import_users(file_lines(args.path), args.format, args.chunk_size or IMPORT_CHUNK_SIZE)
+    finally:
+        shutdown_hash_pool()
+        await dispose_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV or JSONL file, or - for stdin")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="defaults to the file extension (csv)")
+    parser.add_argument("--chunk-size", type=int, help="rows per COPY batch (default IMPORT_CHUNK_SIZE)")
+    parser.add_argument("--workers", type=int, help="Argon2 worker processes (default ARGON2_POOL_SIZE)")
+    parser.add_argument("--errors-out", help="write the per-row errors to this JSON file")
+    args = parser.parse_args()
+    if args.format is None:
+        args.format = "jsonl" if args.path.endswith((".jsonl", ".ndjson")) else "csv"
+    # app.config reads the environment at import
+    if args.workers is not None:
+        os.environ["ARGON2_POOL_SIZE"] = str(args.workers)
+
+    started = time.perf_counter()
+    report = asyncio.run(run(args))
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ Created {report['created']} of {report['total']} rows in {elapsed:.1f}s "
+          f"({report['created'] / elapsed:.0f} users/s)")
+    if report["errors"]:
+        print(f"⚠️ {report['failed']} row(s) rejected")
+        for error in report["errors"][:20]:
+            print(f"  line {error['row']}: {error['email'] or '-'}: {error['error']}")
+        if len(report["errors"]) > 20:
+            print(f"  ... {len(report['errors']) - 20} more")
+    if args.errors_out:
+        with open(args.errors_out, "w") as f:
+            json.dump(report["errors"], f, indent=2)
+        print(f"💾 Errors written to {args.errors_out}")
+    sys.exit(1 if report["failed"] and not report["created"] else 0)
+
+
+if __name__ == "__main__":
+    main()
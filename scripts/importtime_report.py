@@ -0,0 +1,122 @@
+# scripts/importtime_report.py - where does cold start time go?
+"""
+Imports main in a fresh interpreter with `python -X importtime` and prints
+the slowest modules by cumulative and self time. With --serve it also
+starts uvicorn and measures process start -> first 200 from /health,
+which is what a user waiting on a spun-down Render instance sees.
+
+Usage:
+    python -m scripts.importtime_report --top 25
+    python -m scripts.importtime_report --serve --startup-mode eager
+    python -m scripts.importtime_report --json benchmarks/results/importtime.json
+
+Compare runs between commits to keep time-to-first-response from creeping up.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module: str, env: dict) -> list:
+    """[(module, self_us, cumulative_us, depth)] parsed from -X importtime output"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"❌ import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def time_to_first_response(env: dict, port: int, timeout: float) -> float:
+    """Seconds from spawning uvicorn to the first 200 from /health"""
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise SystemExit(f"❌ No response from /health within {timeout:.0f}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def print_table(title: str, rows: list, key: int, top: int):
+    print(f"\n{title}")
+    print(f"{'ms':>9}  module")
+    for row in sorted(rows, key=lambda r: r[key], reverse=True)[:top]:
+        print(f"{row[key] / 1000:>9.1f}  {row[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--startup-mode", choices=["fast", "eager"], help="override STARTUP_MODE")
+    parser.add_argument("--serve", action="store_true", help="also measure time to first /health response")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.startup_mode:
+        env["STARTUP_MODE"] = args.startup_mode
+
+    rows = profile_imports(args.module, env)
+    total_us = next((r[2] for r in rows if r[0] == args.module), sum(r[1] for r in rows))
+    print(f"📦 import {args.module}: {total_us / 1000:.1f} ms across {len(rows)} modules")
+    print_table("Slowest by cumulative time (module + its imports)", rows, 2, args.top)
+    print_table("Slowest by self time", rows, 1, args.top)
+
+    report = {
+        "module": args.module,
+        "import_ms": round(total_us / 1000, 1),
+        "modules": len(rows),
+        "top_cumulative": [
+            {"module": r[0], "ms": round(r[2] / 1000, 2)}
+            for r in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]
+        ],
+        "top_self": [
+            {"module": r[0], "ms": round(r[1] / 1000, 2)}
+            for r in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]
+        ],
+    }
+
+    if args.serve:
+        seconds = time_to_first_response(env, args.port, args.timeout)
+        report["first_response_ms"] = round(seconds * 1000, 1)
+        print(f"\n🚀 Process start -> first /health 200: {seconds * 1000:.0f} ms "
+              f"(STARTUP_MODE={env.get('STARTUP_MODE', 'fast')})")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()